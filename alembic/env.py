@@ -2,7 +2,8 @@ from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
-from main import SQLModel
+from sqlmodel import SQLModel
+import db.models
 
 from alembic import context
 
@@ -0,0 +1,28 @@
+"""Index card.set_id for random card sampling
+
+Revision ID: 3a1c9e7d2b40
+Revises: f8fd462bbe71
+Create Date: 2026-10-18 09:12:41.204118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a1c9e7d2b40'
+down_revision: Union[str, Sequence[str], None] = 'f8fd462bbe71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_card_set_id'), 'card', ['set_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_card_set_id'), table_name='card')
@@ -0,0 +1,35 @@
+"""Add score table for trivia leaderboard
+
+Revision ID: 5d0a8c31e7f2
+Revises: b7e2d4f19c63
+Create Date: 2026-10-18 13:40:02.918274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d0a8c31e7f2'
+down_revision: Union[str, Sequence[str], None] = 'b7e2d4f19c63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('score',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('player', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('player')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('score')
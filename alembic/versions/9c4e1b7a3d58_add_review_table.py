@@ -0,0 +1,43 @@
+"""Add review table for spaced repetition
+
+Revision ID: 9c4e1b7a3d58
+Revises: 5d0a8c31e7f2
+Create Date: 2026-10-18 14:52:36.107733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4e1b7a3d58'
+down_revision: Union[str, Sequence[str], None] = '5d0a8c31e7f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('review',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('card_id', sa.Integer(), nullable=False),
+    sa.Column('ease', sa.Float(), nullable=False),
+    sa.Column('interval', sa.Float(), nullable=False),
+    sa.Column('repetitions', sa.Integer(), nullable=False),
+    sa.Column('due', sqlmodel.sql.sqltypes.UTCDateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['card_id'], ['card.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_review_user_due', 'review', ['user', 'due'], unique=False)
+    op.create_index('ix_review_user_card_id', 'review', ['user', 'card_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_review_user_card_id', table_name='review')
+    op.drop_index('ix_review_user_due', table_name='review')
+    op.drop_table('review')
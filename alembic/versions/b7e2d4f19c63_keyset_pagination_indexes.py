@@ -0,0 +1,32 @@
+"""Indexes for keyset pagination of cards and sets
+
+Revision ID: b7e2d4f19c63
+Revises: 3a1c9e7d2b40
+Create Date: 2026-10-18 10:03:17.551902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2d4f19c63'
+down_revision: Union[str, Sequence[str], None] = '3a1c9e7d2b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_card_front_id', 'card', ['front', 'id'], unique=False)
+    op.create_index('ix_card_set_id_front_id', 'card', ['set_id', 'front', 'id'], unique=False)
+    op.create_index('ix_set_name_id', 'set', ['name', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_set_name_id', table_name='set')
+    op.drop_index('ix_card_set_id_front_id', table_name='card')
+    op.drop_index('ix_card_front_id', table_name='card')
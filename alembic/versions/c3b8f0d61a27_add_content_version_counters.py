@@ -0,0 +1,54 @@
+"""Add content version counters for cached pages
+
+Revision ID: c3b8f0d61a27
+Revises: e1f6a2c9b804
+Create Date: 2026-10-18 18:02:37.118904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3b8f0d61a27'
+down_revision: Union[str, Sequence[str], None] = 'e1f6a2c9b804'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('contentversion',
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # Same triggers as db/versions.py
+    now = "(julianday('now') - 2440587.5) * 86400.0"
+    upsert = "ON CONFLICT(name) DO UPDATE SET version = version + 1, updated = excluded.updated;"
+    op.execute(f"""CREATE TRIGGER card_version_insert AFTER INSERT ON card BEGIN
+        INSERT INTO contentversion(name, version, updated) VALUES ('card', 1, {now}), ('set:' || coalesce(new.set_id, ''), 1, {now}) {upsert}
+    END""")
+    op.execute(f"""CREATE TRIGGER card_version_update AFTER UPDATE ON card BEGIN
+        INSERT INTO contentversion(name, version, updated) VALUES ('card', 1, {now}), ('set:' || coalesce(old.set_id, ''), 1, {now}) {upsert}
+        INSERT INTO contentversion(name, version, updated) VALUES ('set:' || coalesce(new.set_id, ''), 1, {now}) {upsert}
+    END""")
+    op.execute(f"""CREATE TRIGGER card_version_delete AFTER DELETE ON card BEGIN
+        INSERT INTO contentversion(name, version, updated) VALUES ('card', 1, {now}), ('set:' || coalesce(old.set_id, ''), 1, {now}) {upsert}
+    END""")
+    for event in ('insert', 'update', 'delete'):
+        op.execute(f"""CREATE TRIGGER set_version_{event} AFTER {event.upper()} ON "set" BEGIN
+        INSERT INTO contentversion(name, version, updated) VALUES ('set', 1, {now}) {upsert}
+    END""")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for trigger in ('card_version_insert', 'card_version_update', 'card_version_delete',
+                    'set_version_insert', 'set_version_update', 'set_version_delete'):
+        op.execute(f"DROP TRIGGER {trigger}")
+    op.drop_table('contentversion')
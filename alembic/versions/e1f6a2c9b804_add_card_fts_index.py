@@ -0,0 +1,45 @@
+"""Add FTS5 full text index over card front and back
+
+Revision ID: e1f6a2c9b804
+Revises: 9c4e1b7a3d58
+Create Date: 2026-10-18 16:21:09.442517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1f6a2c9b804'
+down_revision: Union[str, Sequence[str], None] = '9c4e1b7a3d58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""CREATE VIRTUAL TABLE card_fts USING fts5(
+        front, back, content='card', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""")
+    op.execute("""CREATE TRIGGER card_fts_insert AFTER INSERT ON card BEGIN
+        INSERT INTO card_fts(rowid, front, back) VALUES (new.id, new.front, new.back);
+    END""")
+    op.execute("""CREATE TRIGGER card_fts_delete AFTER DELETE ON card BEGIN
+        INSERT INTO card_fts(card_fts, rowid, front, back) VALUES ('delete', old.id, old.front, old.back);
+    END""")
+    op.execute("""CREATE TRIGGER card_fts_update AFTER UPDATE OF front, back ON card BEGIN
+        INSERT INTO card_fts(card_fts, rowid, front, back) VALUES ('delete', old.id, old.front, old.back);
+        INSERT INTO card_fts(rowid, front, back) VALUES (new.id, new.front, new.back);
+    END""")
+    # Index the cards that are already there
+    op.execute("INSERT INTO card_fts(card_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER card_fts_update")
+    op.execute("DROP TRIGGER card_fts_delete")
+    op.execute("DROP TRIGGER card_fts_insert")
+    op.execute("DROP TABLE card_fts")
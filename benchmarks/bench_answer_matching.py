@@ -0,0 +1,35 @@
+#Micro-benchmark: guesses checked per second.
+#Compares the old exact string compare with AnswerMatcher, on a mix of right,
+#nearly right and wrong guesses.
+#Run from the project root: python -m benchmarks.bench_answer_matching
+import time
+from core.answers import AnswerMatcher
+
+BACK = "Mount Kilimanjaro | Kilimanjaro"
+GUESSES = [
+    "Mount Kilimanjaro", "kilimanjaro", "Kilimanjaro!", "mount kilimanjero",
+    "Everest", "K2", "mount everest", "I think it's Denali", "lol", "Mont Blanc",
+] * 10_000
+
+def exact(guesses):
+    hits = 0
+    for guess in guesses:
+        hits += guess == BACK
+    return hits
+
+def matched(guesses):
+    matcher = AnswerMatcher(BACK)
+    hits = 0
+    for guess in guesses:
+        hits += matcher.matches(guess)
+    return hits
+
+def main():
+    for name, check in [("exact compare", exact), ("AnswerMatcher", matched)]:
+        start = time.perf_counter()
+        hits = check(GUESSES)
+        seconds = time.perf_counter() - start
+        print(f"{name:<14} {len(GUESSES) / seconds:>12,.0f} guesses/s  {hits:>6} accepted of {len(GUESSES)}")
+
+if __name__ == "__main__":
+    main()
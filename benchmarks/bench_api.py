@@ -0,0 +1,64 @@
+#Benchmark: one page of 200 cards from the JSON api against scraping the same
+#cards out of the html /cards/ page. Reports the payload size (raw and
+#gzipped) and requests per second through the app in-process.
+#Run from the project root: python -m benchmarks.bench_api [cards]
+import gzip
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REQUESTS = 200
+
+def main():
+    cards = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    with tempfile.TemporaryDirectory() as tmp:
+        #The app opens DATABASE_FILE when it's imported
+        os.environ["DATABASE_FILE"] = str(Path(tmp) / "bench.db")
+        from bs4 import BeautifulSoup
+        from fastapi.testclient import TestClient
+        from sqlmodel import SQLModel
+        from db.models import Card, Set
+        from db.session import engine
+        from core.httpcache import page_cache
+        from main import app
+
+        SQLModel.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(Set.__table__.insert(), [{"name": f"Set {i}"} for i in range(1, 101)])
+            conn.execute(Card.__table__.insert(), [
+                {"front": f"What is question number {i}?", "back": f"It is answer number {i}", "set_id": i % 100 + 1}
+                for i in range(cards)
+            ])
+        client = TestClient(app)
+
+        def scrape(response):
+            soup = BeautifulSoup(response.text, "html.parser")
+            return [(div.text, div.find_next_sibling().text) for div in soup.select(".cardFront")]
+
+        def uncached(url):
+            page_cache.clear()
+            return client.get(url)
+
+        cases = [
+            ("html /cards/", lambda: uncached("/cards/?limit=200"), None),
+            ("html /cards/ (cached)", lambda: client.get("/cards/?limit=200"), None),
+            ("html scrape", lambda: uncached("/cards/?limit=200"), scrape),
+            ("api cards", lambda: client.get("/api/v1/cards?limit=200"), None),
+            ("api cards front,back", lambda: client.get("/api/v1/cards?limit=200&fields=front,back"), None),
+        ]
+        print(f"{cards} cards, pages of 200")
+        print(f"{'':<22} {'bytes':>8} {'gzip':>7} {'req/s':>8}")
+        for name, fetch, parse in cases:
+            body = fetch().content
+            start = time.perf_counter()
+            for _ in range(REQUESTS):
+                response = fetch()
+                if parse:
+                    parse(response)
+            rate = REQUESTS / (time.perf_counter() - start)
+            print(f"{name:<22} {len(body):>8} {len(gzip.compress(body)):>7} {rate:>8.0f}")
+
+if __name__ == "__main__":
+    main()
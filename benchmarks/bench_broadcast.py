@@ -0,0 +1,72 @@
+#Benchmark: fan-out of one message to many simulated websocket clients.
+#Compares awaiting each socket in turn (the old broadcast) with the queued
+#ConnectionManager. 1% of the clients take 10ms per send.
+#Run from the project root: python -m benchmarks.bench_broadcast
+import asyncio
+import time
+from core.connections import ConnectionManager
+
+CLIENTS = [1_000, 5_000, 10_000]
+MESSAGES = 20
+SLOW_EVERY = 100
+
+class FakeWebSocket:
+    def __init__(self, delay, done):
+        self.delay = delay
+        self.done = done
+        self.received = 0
+    async def accept(self):
+        pass
+    async def send(self, message):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received += 1
+        if self.received == MESSAGES:
+            self.done()
+    async def send_text(self, text):
+        await self.send({"type": "websocket.send", "text": text})
+    async def close(self, code=1000, reason=None):
+        pass
+
+def make_clients(count, done):
+    return [FakeWebSocket(0.01 if i % SLOW_EVERY == 0 else 0, done) for i in range(count)]
+
+async def sequential(count):
+    clients = make_clients(count, lambda: None)
+    start = time.perf_counter()
+    for i in range(MESSAGES):
+        for client in clients:
+            await client.send_text(f"message {i}")
+    return (time.perf_counter() - start) * 1000
+
+async def queued(count):
+    remaining = [count]
+    finished = asyncio.Event()
+    def done():
+        remaining[0] -= 1
+        if remaining[0] == 0:
+            finished.set()
+    manager = ConnectionManager(max_queue=MESSAGES)
+    clients = make_clients(count, done)
+    for client in clients:
+        await manager.connect(client)
+    start = time.perf_counter()
+    for i in range(MESSAGES):
+        await manager.broadcast(f"message {i}")
+    fanout = (time.perf_counter() - start) * 1000
+    await finished.wait()
+    delivered = (time.perf_counter() - start) * 1000
+    for client in clients:
+        manager.disconnect(client)
+    return fanout, delivered
+
+def main():
+    print(f"{MESSAGES} messages per run, times in ms")
+    print(f"{'clients':>8} {'sequential':>11} {'queued fan-out':>15} {'queued delivered':>17}")
+    for count in CLIENTS:
+        old = asyncio.run(sequential(count))
+        fanout, delivered = asyncio.run(queued(count))
+        print(f"{count:>8} {old:>11.1f} {fanout:>15.1f} {delivered:>17.1f}")
+
+if __name__ == "__main__":
+    main()
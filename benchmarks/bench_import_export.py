@@ -0,0 +1,52 @@
+#Benchmark: bulk import and streaming export, rows per second.
+#Compares importing with the batched importer against one insert and commit
+#per card (what the add card form does).
+#Run from the project root: python -m benchmarks.bench_import_export [rows]
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+from sqlmodel import Session, SQLModel
+from db.models import Card
+from db.session import create_sqlite_engine
+from core.bulk import read_rows, import_cards, export_cards
+
+def make_csv(rows):
+    lines = ["front,back,set"] + [f"Question {i},Answer {i},Set {i % 50}" for i in range(rows)]
+    return ("\n".join(lines) + "\n").encode()
+
+def one_by_one(session, rows):
+    for number, front, back, set_name in rows:
+        session.add(Card(front=front, back=back))
+        session.commit()
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    upload = make_csv(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_sqlite_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            for batch_size in (100, 1_000, 10_000):
+                start = time.perf_counter()
+                import_cards(session, read_rows(io.BytesIO(upload), "csv"), batch_size)
+                seconds = time.perf_counter() - start
+                print(f"import batch {batch_size:>6}   {rows / seconds:>10,.0f} rows/s")
+
+            #The old way is slow, so only time a slice of it
+            sample = rows // 10
+            start = time.perf_counter()
+            one_by_one(session, read_rows(io.BytesIO(make_csv(sample)), "csv"))
+            seconds = time.perf_counter() - start
+            print(f"import one at a time  {sample / seconds:>10,.0f} rows/s")
+
+            total = rows * 3 + sample
+            for format in ("csv", "jsonl"):
+                start = time.perf_counter()
+                size = sum(len(chunk) for chunk in export_cards(session, format))
+                seconds = time.perf_counter() - start
+                print(f"export {format:<5}          {total / seconds:>10,.0f} rows/s  ({size / 1e6:.1f}MB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#Benchmark: requests per second on / and /cards/{id} through the old
+#BaseHTTPMiddleware proxy middleware, the plain ASGI one in core/proxy.py,
+#and none at all, with the rest of the app's middleware left as it is.
+#Requests go through httpx's ASGI transport in-process.
+#Run from the project root: python -m benchmarks.bench_proxy_middleware [requests]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HEADERS = {"X-Forwarded-Proto": "https", "X-Forwarded-Host": "cards.example.com"}
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    with tempfile.TemporaryDirectory() as tmp:
+        #The app opens DATABASE_FILE when it's imported
+        os.environ["DATABASE_FILE"] = str(Path(tmp) / "bench.db")
+        import httpx
+        from starlette.middleware import Middleware
+        from starlette.middleware.base import BaseHTTPMiddleware
+        from sqlmodel import SQLModel, Session
+        from db.models import Card
+        from db.session import engine
+        from core.proxy import ProxyHeadersMiddleware
+        from main import app
+
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            card = Card(front="What is H2O?", back="Water")
+            session.add(card)
+            session.commit()
+            card_id = card.id
+
+        #What main.py used to have
+        class OldProxyHeadersMiddleware(BaseHTTPMiddleware):
+            async def dispatch(self, request, call_next):
+                if "x-forwarded-proto" in request.headers:
+                    request.scope["scheme"] = request.headers["x-forwarded-proto"]
+                if "x-forwarded-host" in request.headers:
+                    request.scope["server"] = (request.headers["x-forwarded-host"], None)
+                return await call_next(request)
+
+        others = [middleware for middleware in app.user_middleware if middleware.cls is not ProxyHeadersMiddleware]
+        def with_proxy(cls):
+            app.user_middleware = others + ([Middleware(cls)] if cls else [])
+            app.middleware_stack = app.build_middleware_stack()
+            return app
+
+        stacks = {
+            "none": None,
+            "BaseHTTPMiddleware": OldProxyHeadersMiddleware,
+            "pure ASGI": ProxyHeadersMiddleware,
+        }
+
+        async def run(stack, url):
+            transport = httpx.ASGITransport(app=stack)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                assert (await client.get(url, headers=HEADERS)).status_code == 200
+                start = time.perf_counter()
+                for _ in range(requests):
+                    await client.get(url, headers=HEADERS)
+                return requests / (time.perf_counter() - start)
+
+        print(f"{'middleware':<20} {'/ req/s':>9} {'/cards/{id} req/s':>18}")
+        for name, cls in stacks.items():
+            stack = with_proxy(cls)
+            home = asyncio.run(run(stack, "/"))
+            card = asyncio.run(run(stack, f"/cards/{card_id}"))
+            print(f"{name:<20} {home:>9.0f} {card:>18.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#Benchmark: random card selection as the table grows.
+#Run from the project root: python -m benchmarks.bench_random_card
+import random
+import sys
+import time
+from sqlmodel import Session, SQLModel, create_engine, select
+from db.models import Card, Set
+from core.sampler import random_card
+
+SIZES = [1_000, 10_000, 100_000]
+ROUNDS = 200
+
+def seed(size):
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(Set.__table__.insert(), [{"id": i, "name": f"Set {i}"} for i in range(1, 11)])
+        conn.execute(Card.__table__.insert(), [
+            {"front": f"Question {i}", "back": f"Answer {i}", "set_id": i % 10 + 1}
+            for i in range(size)
+        ])
+    return engine
+
+#The old way: load every card and pick one
+def load_all(session, set_id=None):
+    cards = session.exec(select(Card)).all()
+    return cards[random.randint(0, (len(cards)-1))]
+
+def time_it(fn, session, set_id=None, rounds=ROUNDS):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(session, set_id)
+    return (time.perf_counter() - start) / rounds * 1000
+
+def main():
+    print(f"{'cards':>8} {'load all (ms)':>14} {'sampler (ms)':>13} {'sampler by set (ms)':>20}")
+    for size in SIZES:
+        engine = seed(size)
+        with Session(engine) as session:
+            #Loading everything is slow, so only do a few rounds of it
+            old = time_it(load_all, session, rounds=5)
+            new = time_it(random_card, session)
+            scoped = time_it(random_card, session, set_id=3)
+        print(f"{size:>8} {old:>14.3f} {new:>13.3f} {scoped:>20.3f}")
+
+if __name__ == "__main__":
+    sys.exit(main())
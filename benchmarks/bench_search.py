@@ -0,0 +1,57 @@
+#Benchmark: FTS5 search against a LIKE scan of card fronts and backs.
+#Run from the project root: python -m benchmarks.bench_search [cards]
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from sqlmodel import Session, SQLModel, select, or_
+from db.models import Card
+from db.session import create_sqlite_engine
+from core.search import search_cards
+
+#A made up vocabulary of ~40k words, so like real decks most words only
+#turn up on a few cards. "the" is on every card, to show the cost of
+#ranking a very common word.
+SYLLABLES = "ba ce di fo gu ha ke li mo nu pa re si to vu za xe yo".split()
+WORDS = sorted({a + b + c + d for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES for d in SYLLABLES[:7]})
+QUERIES = [WORDS[100], WORDS[5000][:5], f"{WORDS[20000]} {WORDS[20001]}", "nosuchword", "the"]
+ROUNDS = 20
+
+def seed(engine, cards):
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(1)
+    batch = 50_000
+    with engine.begin() as conn:
+        for start in range(0, cards, batch):
+            conn.execute(Card.__table__.insert(), [
+                {"front": "the " + " ".join(rng.choices(WORDS, k=6)), "back": " ".join(rng.choices(WORDS, k=3)), "set_id": i % 100 + 1}
+                for i in range(start, min(cards, start + batch))
+            ])
+
+def like(session, text, set_id=None, limit=20):
+    query = select(Card)
+    for word in text.split():
+        query = query.where(or_(Card.front.like(f"%{word}%"), Card.back.like(f"%{word}%")))
+    return session.exec(query.limit(limit)).all()
+
+def main():
+    cards = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_sqlite_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        start = time.perf_counter()
+        seed(engine, cards)
+        print(f"seeded {cards} cards (with the FTS index) in {time.perf_counter() - start:.1f}s")
+        print(f"{'query':<16} {'fts (ms)':>9} {'like (ms)':>10}")
+        with Session(engine) as session:
+            for text in QUERIES:
+                timings = []
+                for fn in (search_cards, like):
+                    begin = time.perf_counter()
+                    for _ in range(ROUNDS):
+                        fn(session, text)
+                    timings.append((time.perf_counter() - begin) / ROUNDS * 1000)
+                print(f"{text:<16} {timings[0]:>9.2f} {timings[1]:>10.2f}")
+
+if __name__ == "__main__":
+    main()
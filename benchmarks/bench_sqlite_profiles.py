@@ -0,0 +1,68 @@
+#Benchmark: N reader threads + M writer threads against each engine profile.
+#Run from the project root: python -m benchmarks.bench_sqlite_profiles [readers] [writers]
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel, select
+from db.models import Card, Set
+from db.session import SQLITE_PROFILES, create_sqlite_engine
+
+SECONDS = 5
+CARDS = 10_000
+
+def seed(engine):
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(Set.__table__.insert(), [{"id": 1, "name": "Bench"}])
+        conn.execute(Card.__table__.insert(), [
+            {"front": f"Question {i}", "back": f"Answer {i}", "set_id": 1} for i in range(CARDS)
+        ])
+
+def reader(engine, stop, counts):
+    while not stop.is_set():
+        with Session(engine) as session:
+            session.get(Card, random.randint(1, CARDS))
+            session.exec(select(Card).where(Card.set_id == 1).order_by(Card.front).limit(50)).all()
+        counts["reads"] += 1
+
+def writer(engine, stop, counts):
+    while not stop.is_set():
+        try:
+            with Session(engine) as session:
+                session.add(Card(front="New", back="Card", set_id=1))
+                session.commit()
+            counts["writes"] += 1
+        except OperationalError:
+            counts["errors"] += 1
+
+def run(profile, readers, writers):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_sqlite_engine(f"sqlite:///{Path(tmp) / 'bench.db'}", profile)
+        seed(engine)
+        stop = threading.Event()
+        counts = {"reads": 0, "writes": 0, "errors": 0}
+        threads = [threading.Thread(target=reader, args=(engine, stop, counts)) for _ in range(readers)]
+        threads += [threading.Thread(target=writer, args=(engine, stop, counts)) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(SECONDS)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+    return counts
+
+def main():
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    print(f"{readers} readers, {writers} writers, {SECONDS}s per profile")
+    for profile in SQLITE_PROFILES:
+        counts = run(profile, readers, writers)
+        print(f"{profile:<11} reads/s {counts['reads'] / SECONDS:9.1f}  writes/s {counts['writes'] / SECONDS:8.1f}  locked errors {counts['errors']}")
+
+if __name__ == "__main__":
+    main()
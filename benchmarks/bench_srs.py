@@ -0,0 +1,47 @@
+#Simulation benchmark: next-card latency for spaced repetition as the number
+#of reviews grows. Seeds CARDS cards and USERS users, lets every user review
+#more and more cards, and times next_card for random users at each step.
+#Run from the project root: python -m benchmarks.bench_srs [cards] [users]
+import random
+import sys
+import time
+from datetime import timedelta
+from sqlmodel import Session, SQLModel, create_engine
+from db.models import Card, Review
+from core.srs import next_card, utcnow
+
+STEPS = [10, 100, 1_000]
+LOOKUPS = 500
+
+def main():
+    cards = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(Card.__table__.insert(), [{"front": f"Q{i}", "back": f"A{i}", "set_id": i % 20 + 1} for i in range(cards)])
+
+    now = utcnow()
+    reviewed = 0
+    print(f"{cards} cards, {users} users")
+    print(f"{'reviews/user':>13} {'review rows':>12} {'next card (ms)':>15} {'set scoped (ms)':>16}")
+    for step in STEPS:
+        #Each user has reviewed their first `step` cards; a tenth are due
+        with engine.begin() as conn:
+            conn.execute(Review.__table__.insert(), [
+                {"user": f"user{u}", "card_id": c, "ease": 2.5, "interval": 1, "repetitions": 1,
+                 "due": now + timedelta(days=-1 if random.random() < 0.1 else random.randint(1, 30))}
+                for u in range(users) for c in range(reviewed + 1, step + 1)
+            ])
+        reviewed = step
+        with Session(engine) as session:
+            timings = {}
+            for name, set_id in (("all", None), ("set", 3)):
+                start = time.perf_counter()
+                for _ in range(LOOKUPS):
+                    next_card(session, f"user{random.randrange(users)}", set_id, now)
+                timings[name] = (time.perf_counter() - start) / LOOKUPS * 1000
+        print(f"{step:>13} {step * users:>12} {timings['all']:>15.3f} {timings['set']:>16.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#Benchmark: how long a new worker takes to be useful. Times `import main`,
+#then starts uvicorn and times how long until it answers / and how long the
+#first /cards/ and /sets/ requests take, for:
+#  create: create_all on boot, empty template bytecode cache (the old boot)
+#  check:  SCHEMA_STARTUP=check, template bytecode cache already filled
+#Run from the project root: python -m benchmarks.bench_startup [runs]
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.load import free_port, ROOT
+
+IMPORT = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+
+def import_seconds(env: dict) -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+def boot(env: dict) -> dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        while True:
+            try:
+                if httpx.get(url + "/", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.005)
+        ready = time.perf_counter() - start
+        first = {}
+        for path in ("/cards/", "/sets/"):
+            begin = time.perf_counter()
+            httpx.get(url + path, timeout=10).raise_for_status()
+            first[path] = time.perf_counter() - begin
+        return {"ready": ready, **first}
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Path(tmp) / "boot.db"
+        env = dict(os.environ, DATABASE_FILE=str(database), PYTHONPATH=str(ROOT))
+        #A migrated database, stamped at the newest revision
+        subprocess.run([sys.executable, "-c", "from db.session import create_db_and_tables; create_db_and_tables()"],
+                       cwd=ROOT, env=env, check=True)
+        from db.schema import head_revisions
+        import sqlite3
+        with sqlite3.connect(database) as conn:
+            conn.execute("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)")
+            conn.executemany("INSERT INTO alembic_version VALUES (?)", [(head,) for head in head_revisions()])
+
+        print(f"import main: {statistics.median(import_seconds(env) for _ in range(runs)) * 1000:.0f}ms (median of {runs})")
+        print(f"{'boot':<8} {'ready (ms)':>11} {'first /cards/ (ms)':>19} {'first /sets/ (ms)':>18}")
+        warm_cache = Path(tmp) / "warm"
+        subprocess.run([sys.executable, "-m", "core.templates"], cwd=ROOT, check=True,
+                       env=dict(env, TEMPLATE_CACHE_DIR=str(warm_cache)), capture_output=True)
+        for name in ("create", "check"):
+            results = []
+            for run in range(runs):
+                if name == "create":
+                    mode = dict(env, SCHEMA_STARTUP="create", TEMPLATE_CACHE_DIR=str(Path(tmp) / f"cold{run}"))
+                else:
+                    mode = dict(env, SCHEMA_STARTUP="check", TEMPLATE_CACHE_DIR=str(warm_cache))
+                results.append(boot(mode))
+            median = {key: statistics.median(result[key] for result in results) * 1000 for key in results[0]}
+            print(f"{name:<8} {median['ready']:>11.0f} {median['/cards/']:>19.1f} {median['/sets/']:>18.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#Load test: websocket broadcast latency with and without HTTP CRUD traffic.
+#Starts the app with uvicorn on a local port against a throwaway database.
+#Run from the project root: python -m benchmarks.bench_ws_under_load
+import asyncio
+import json
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+import httpx
+import uvicorn
+import websockets
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from main import app
+from db.models import Card, Set
+from db.session import get_session, get_async_session
+
+PORT = 8765
+PLAYERS = 20
+MESSAGES = 100
+HTTP_WORKERS = 8
+
+def use_database(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Set(id=1, name="Bench"))
+        session.add_all([Card(front=f"Q{i}", back=f"A{i}", set_id=1) for i in range(1000)])
+        session.commit()
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_async_session_override
+
+def start_server():
+    server = uvicorn.Server(uvicorn.Config(app, port=PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+#Time from one player sending a chat message until every player has it
+async def broadcast_latencies(players):
+    sender = players[0]
+    latencies = []
+    for i in range(MESSAGES):
+        start = time.perf_counter()
+        await sender.send(json.dumps({"type": "chat", "payload": {"message": f"ping {i}"}}))
+        await asyncio.gather(*[wait_for(player, f"ping {i}") for player in players])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+async def wait_for(player, text):
+    while not (await player.recv()).endswith(text):
+        pass
+
+async def crud_traffic(stop, counter):
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}") as client:
+        while not stop.is_set():
+            response = await client.post("/cards/add", data={"front": "Load", "back": "Test", "set_id": 1})
+            card_url = response.headers["location"]
+            await client.get(card_url)
+            await client.post(card_url + "/edit", data={"front": "Load", "back": "Tested", "set_id": 1})
+            counter[0] += 3
+
+def report(name, latencies, requests=None, seconds=None):
+    latencies = sorted(latencies)
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+    line = f"{name:<14} p50 {p(0.5):7.2f}ms  p95 {p(0.95):7.2f}ms  p99 {p(0.99):7.2f}ms"
+    if requests is not None:
+        line += f"  http {requests / seconds:7.1f} req/s"
+    print(line)
+
+async def run():
+    players = [await websockets.connect(f"ws://127.0.0.1:{PORT}/ws/player{i}") for i in range(PLAYERS)]
+    report("idle", await broadcast_latencies(players))
+
+    stop = asyncio.Event()
+    counter = [0]
+    workers = [asyncio.create_task(crud_traffic(stop, counter)) for _ in range(HTTP_WORKERS)]
+    start = time.perf_counter()
+    latencies = await broadcast_latencies(players)
+    seconds = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*workers)
+    report("with crud load", latencies, counter[0], seconds)
+
+    for player in players:
+        await player.close()
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        use_database(Path(tmp) / "bench.db")
+        server, thread = start_server()
+        try:
+            asyncio.run(run())
+        finally:
+            server.should_exit = True
+            thread.join()
+            app.dependency_overrides.clear()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+#Load test for the whole app. For each database size it seeds a SQLite file
+#(cached under --data-dir, so reruns skip it), starts uvicorn on it, drives
+#the http routes and the websocket game with concurrent clients, and prints
+#p50/p95/p99 latency, throughput and the server's peak memory as json.
+#Everything runs on this machine; nothing leaves it.
+#
+#Run from the project root:
+#   python -m benchmarks.load --cards 1000,100000,1000000 --out bench.json
+#   python -m benchmarks.load --cards 1000 --baseline bench.json   #fails on regressions
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import websockets
+
+SETS = 100
+ROOT = Path(__file__).resolve().parent.parent
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def summary(latencies: list[float], errors: int, seconds: float) -> dict:
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput": round(len(latencies) / seconds, 1) if seconds else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+##Seeding
+def seed(path: Path, cards: int):
+    if path.exists():
+        return 0.0
+    start = time.perf_counter()
+    partial = path.with_suffix(".partial")
+    partial.unlink(missing_ok=True)
+    #Same schema (indexes, FTS and version triggers) as the app makes
+    from sqlmodel import SQLModel
+    from db.session import create_sqlite_engine
+    import db.models
+    engine = create_sqlite_engine(f"sqlite:///{partial}", "default")
+    SQLModel.metadata.create_all(engine)
+    engine.dispose()
+    rng = random.Random(cards)
+    with sqlite3.connect(partial) as conn:
+        conn.executemany('INSERT INTO "set"(id, name) VALUES (?, ?)', [(i, f"Set {i}") for i in range(1, SETS + 1)])
+        batch = 50_000
+        for first in range(0, cards, batch):
+            conn.executemany("INSERT INTO card(front, back, set_id) VALUES (?, ?, ?)", [
+                (f"Question {i} about topic {rng.randrange(10_000)}", f"Answer {i}", i % SETS + 1)
+                for i in range(first, min(cards, first + batch))
+            ])
+    partial.rename(path)
+    return time.perf_counter() - start
+
+##Server
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def peak_rss_mb(pid: int) -> float | None:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+class Server:
+
+    def __init__(self, database: Path):
+        self.database = database
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process: subprocess.Popen | None = None
+
+    def __enter__(self):
+        env = dict(os.environ, DATABASE_FILE=str(self.database), PYTHONPATH=str(ROOT))
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(self.port), "--log-level", "warning"],
+            cwd=ROOT, env=env,
+        )
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(self.url + "/", timeout=1).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise RuntimeError("uvicorn didn't start")
+
+    def __exit__(self, *exc):
+        self.peak_rss_mb = peak_rss_mb(self.process.pid)
+        self.process.terminate()
+        self.process.wait(timeout=30)
+        if self.peak_rss_mb is None:
+            #Not linux: the largest child we've waited for so far
+            rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+            self.peak_rss_mb = round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+##Http
+#Each scenario returns the (method, path, form data) of one request
+def scenarios(cards: int) -> dict:
+    def card_id():
+        return random.randint(1, cards)
+    return {
+        "home": lambda: ("GET", "/", None),
+        "learn": lambda: ("GET", "/learn/", None),
+        "cards": lambda: ("GET", "/cards/", None),
+        "set": lambda: ("GET", f"/sets/{random.randint(1, SETS)}", None),
+        "card": lambda: ("GET", f"/cards/{card_id()}", None),
+        "create_card": lambda: ("POST", "/cards/add", {"front": "Load test?", "back": "Yes", "set_id": random.randint(1, SETS)}),
+        "edit_card": lambda: ("POST", f"/cards/{card_id()}/edit", {"front": "Edited?", "back": "Yes", "set_id": random.randint(1, SETS)}),
+    }
+
+async def drive(url: str, make, requests: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60, follow_redirects=False) as client:
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                method, path, data = make()
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, path, data=data)
+                    if response.status_code >= 400:
+                        errors += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return summary(latencies, errors, time.perf_counter() - start)
+
+##Websockets
+#Every client joins a room of `room_size` players and chats; latency is the
+#time until the client sees its own message come back in the broadcast.
+#One player per room also keeps asking for the next trivia question.
+async def drive_websockets(url: str, clients: int, room_size: int, messages: int, interval: float) -> dict:
+    ws_url = url.replace("http://", "ws://")
+    latencies: list[float] = []
+    errors = 0
+    received = 0
+
+    async def player(number: int):
+        nonlocal errors, received
+        room = f"load{number // room_size}"
+        name = f"p{number}"
+        sent: dict[str, float] = {}
+        try:
+            async with websockets.connect(f"{ws_url}/ws/{room}/{name}", max_queue=None) as websocket:
+                async def reader():
+                    nonlocal received
+                    async for frame in websocket:
+                        received += 1
+                        text = frame if isinstance(frame, str) else frame.decode(errors="replace")
+                        for key in list(sent):
+                            if key in text:
+                                latencies.append(time.perf_counter() - sent.pop(key))
+                read = asyncio.create_task(reader())
+                await asyncio.sleep(random.random() * interval)
+                for i in range(messages):
+                    key = f"{name}-m{i}"
+                    sent[key] = time.perf_counter()
+                    await websocket.send(json.dumps({"type": "chat", "payload": {"message": key}}))
+                    if number % room_size == 0:
+                        await websocket.send(json.dumps({"type": "trivia", "payload": {"action": "nextQuestion"}}))
+                    await asyncio.sleep(interval)
+                #Give the last broadcasts a moment to arrive
+                deadline = time.perf_counter() + 5
+                while sent and time.perf_counter() < deadline:
+                    await asyncio.sleep(0.05)
+                errors += len(sent)
+                read.cancel()
+        except (OSError, websockets.WebSocketException):
+            errors += messages
+
+    start = time.perf_counter()
+    await asyncio.gather(*(player(i) for i in range(clients)))
+    seconds = time.perf_counter() - start
+    result = summary(latencies, errors, seconds)
+    result.update({"clients": clients, "room_size": room_size, "frames_received": received,
+                   "frames_per_second": round(received / seconds, 1)})
+    return result
+
+##Regressions
+#Compare p95 latency and throughput with an earlier run of the same sizes
+def regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    found = []
+    old_runs = {run["cards"]: run for run in baseline.get("runs", [])}
+    for run in results["runs"]:
+        old = old_runs.get(run["cards"])
+        if old is None:
+            continue
+        for name, now in [*run["http"].items(), ("websocket", run["websocket"])]:
+            before = old["http"].get(name) if name != "websocket" else old.get("websocket")
+            if not before:
+                continue
+            if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                found.append(f"{run['cards']} cards {name}: p95 {before['p95_ms']}ms -> {now['p95_ms']}ms")
+            if before["throughput"] and now["throughput"] < before["throughput"] * (1 - tolerance):
+                found.append(f"{run['cards']} cards {name}: throughput {before['throughput']} -> {now['throughput']}/s")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cards", default="1000,100000,1000000", help="comma separated database sizes")
+    parser.add_argument("--requests", type=int, default=500, help="requests per http scenario")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent http clients")
+    parser.add_argument("--ws-clients", type=int, default=100)
+    parser.add_argument("--room-size", type=int, default=10)
+    parser.add_argument("--ws-messages", type=int, default=20, help="chat messages per websocket client")
+    parser.add_argument("--ws-interval", type=float, default=0.1, help="seconds between a client's messages")
+    parser.add_argument("--only", help="comma separated http scenarios to run (default all)")
+    parser.add_argument("--data-dir", default=str(ROOT / "benchmarks" / "data"))
+    parser.add_argument("--out", help="write the json here as well as to stdout")
+    parser.add_argument("--baseline", help="json from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before --baseline fails")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    results = {
+        "meta": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "settings": {key: value for key, value in vars(args).items() if key not in ("out", "baseline")},
+        },
+        "runs": [],
+    }
+    for cards in [int(size) for size in args.cards.split(",")]:
+        database = data_dir / f"cards-{cards}.db"
+        seed_seconds = seed(database, cards)
+        #Writes from a previous run would make the next one slower, so run on a copy
+        work = database.with_suffix(".run.db")
+        for suffix in ("", "-wal", "-shm"):
+            Path(str(work) + suffix).unlink(missing_ok=True)
+        work.write_bytes(database.read_bytes())
+        run = {"cards": cards, "seed_seconds": round(seed_seconds, 2), "http": {}}
+        with Server(work) as server:
+            chosen = scenarios(cards)
+            if args.only:
+                chosen = {name: make for name, make in chosen.items() if name in args.only.split(",")}
+            for name, make in chosen.items():
+                run["http"][name] = asyncio.run(drive(server.url, make, args.requests, args.concurrency))
+                print(f"{cards} cards {name}: {run['http'][name]}", file=sys.stderr)
+            run["websocket"] = asyncio.run(drive_websockets(
+                server.url, args.ws_clients, args.room_size, args.ws_messages, args.ws_interval))
+            print(f"{cards} cards websocket: {run['websocket']}", file=sys.stderr)
+        run["peak_rss_mb"] = server.peak_rss_mb
+        results["runs"].append(run)
+        for suffix in ("", "-wal", "-shm"):
+            Path(str(work) + suffix).unlink(missing_ok=True)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.out:
+        Path(args.out).write_text(output)
+    if args.baseline:
+        found = regressions(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
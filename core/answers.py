@@ -0,0 +1,80 @@
+import string
+
+#Cards can list other accepted answers in the back, separated by this
+ALIAS_SEPARATOR = "|"
+
+#Punctuation becomes a space, so "New-York" and "new york" look the same
+_FOLD = str.maketrans({c: " " for c in string.punctuation})
+_ARTICLES = {"a", "an", "the"}
+
+#Lowercase, drop punctuation and leading articles, squash whitespace
+def normalize(text: str) -> str:
+    words = text.casefold().translate(_FOLD).split()
+    if len(words) > 1 and words[0] in _ARTICLES:
+        words = words[1:]
+    return " ".join(words)
+
+#How many typos we forgive: none in short answers or anything with a
+#number in it (1945 is not 1946), then one, then two
+def allowed_typos(answer: str) -> int:
+    if len(answer) <= 3 or any(c.isdigit() for c in answer):
+        return 0
+    if len(answer) <= 7:
+        return 1
+    return 2
+
+#Levenshtein distance, but gives up (returning limit + 1) as soon as it's
+#clear the two strings are more than `limit` edits apart
+def bounded_distance(a: str, b: str, limit: int) -> int:
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    #A shared start or end never costs anything, so only compare the middle
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a = a[start:len(a) - end]
+    b = b[start:len(b) - end]
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        best = i
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            current.append(cost)
+            if cost < best:
+                best = cost
+        if best > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+#Everything we need to check guesses against one card, worked out once when
+#the question is drawn rather than on every chat message
+class AnswerMatcher:
+
+    def __init__(self, back: str):
+        answers = [normalize(answer) for answer in back.split(ALIAS_SEPARATOR)]
+        self.exact = {answer for answer in answers if answer}
+        #Only answers that allow typos need the slow path
+        self.fuzzy = [(answer, frozenset(answer), allowed_typos(answer)) for answer in self.exact if allowed_typos(answer)]
+
+    def matches(self, guess: str) -> bool:
+        guess = normalize(guess)
+        if guess in self.exact:
+            return True
+        if not self.fuzzy:
+            return False
+        letters = set(guess)
+        for answer, answer_letters, limit in self.fuzzy:
+            #Cheap checks first: each edit changes the length by at most one
+            #and brings in or removes at most one distinct letter
+            if abs(len(guess) - len(answer)) > limit:
+                continue
+            if len(letters - answer_letters) > limit or len(answer_letters - letters) > limit:
+                continue
+            if bounded_distance(guess, answer, limit) <= limit:
+                return True
+        return False
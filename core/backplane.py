@@ -0,0 +1,188 @@
+import asyncio
+import json
+import os
+import sys
+from typing import Any, Awaitable, Callable
+from urllib.parse import urlparse
+
+#Called with (room id, message) for every message published to a room
+Deliver = Callable[[str, Any], Awaitable[None]]
+
+#A backplane carries room broadcasts and shared room state (like the current
+#trivia card) between every worker process serving the game.
+#Implementations only need publish/set_state; reads come from a local copy
+#of the state so they never wait on the network.
+class Backplane:
+
+    def __init__(self):
+        self.deliver: Deliver | None = None
+        self.state: dict[str, dict[str, Any]] = {}
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, room_id: str, message):
+        raise NotImplementedError
+
+    async def set_state(self, room_id: str, key: str, value):
+        raise NotImplementedError
+
+    #Set key to value only if it still equals expected. Returns whether it
+    #did, and only one of several racing callers can win.
+    async def compare_and_set(self, room_id: str, key: str, expected, value) -> bool:
+        raise NotImplementedError
+
+    def get_state(self, room_id: str, key: str, default=None):
+        return self.state.get(room_id, {}).get(key, default)
+
+    #The last local player left the room
+    def forget(self, room_id: str):
+        pass
+
+#Single worker: everything stays in this process
+class InProcessBackplane(Backplane):
+
+    async def publish(self, room_id: str, message):
+        await self.deliver(room_id, message)
+
+    async def set_state(self, room_id: str, key: str, value):
+        self.state.setdefault(room_id, {})[key] = value
+
+    #No await between the check and the set, so nothing can get in between
+    async def compare_and_set(self, room_id: str, key: str, expected, value) -> bool:
+        if self.get_state(room_id, key) != expected:
+            return False
+        self.state.setdefault(room_id, {})[key] = value
+        return True
+
+    #Nobody else can be in the room, so its state can go too
+    def forget(self, room_id: str):
+        self.state.pop(room_id, None)
+
+#Several workers: each one connects to a broker (see run_broker below) over a
+#unix socket or tcp, and the broker relays every line it gets to every
+#worker, the sender included, as newline separated json. A Redis pub/sub
+#channel plus a hash per room would slot in the same way.
+class SocketBackplane(Backplane):
+
+    def __init__(self, url: str):
+        super().__init__()
+        self.url = url
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self.task: asyncio.Task | None = None
+        #compare_and_set calls waiting for the broker's answer
+        self.pending: dict[int, asyncio.Future] = {}
+        self.next_id = 0
+
+    async def start(self):
+        self.reader, self.writer = await open_connection(self.url)
+        #The broker starts us off with a snapshot of the room state
+        snapshot = json.loads(await self.reader.readline())
+        self.state = snapshot["state"]
+        self.task = asyncio.create_task(self.listen())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+    async def listen(self):
+        while line := await self.reader.readline():
+            event = json.loads(line)
+            if event["op"] == "pub":
+                await self.deliver(event["room"], event["msg"])
+            elif event["op"] == "set":
+                self.state.setdefault(event["room"], {})[event["key"]] = event["value"]
+            elif event["op"] == "cas_result":
+                future = self.pending.pop(event["id"], None)
+                if future is not None and not future.done():
+                    future.set_result(event["ok"])
+
+    async def send(self, event: dict):
+        self.writer.write(json.dumps(event).encode() + b"\n")
+        await self.writer.drain()
+
+    async def publish(self, room_id: str, message):
+        await self.send({"op": "pub", "room": room_id, "msg": message})
+
+    async def set_state(self, room_id: str, key: str, value):
+        #Update our copy straight away so this worker reads its own write
+        self.state.setdefault(room_id, {})[key] = value
+        await self.send({"op": "set", "room": room_id, "key": key, "value": value})
+
+    #The broker is the only place that can decide races between workers
+    async def compare_and_set(self, room_id: str, key: str, expected, value) -> bool:
+        self.next_id += 1
+        future = self.pending[self.next_id] = asyncio.get_running_loop().create_future()
+        await self.send({"op": "cas", "id": self.next_id, "room": room_id, "key": key, "expected": expected, "value": value})
+        return await future
+
+async def open_connection(url: str):
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        return await asyncio.open_unix_connection(parsed.path)
+    return await asyncio.open_connection(parsed.hostname, parsed.port)
+
+#The broker: relays events to every connected worker and keeps the room state
+#so workers that start later can catch up
+async def run_broker(url: str, started: asyncio.Event | None = None):
+    workers: set[asyncio.StreamWriter] = set()
+    state: dict[str, dict[str, Any]] = {}
+
+    def relay(line: bytes):
+        for worker in list(workers):
+            try:
+                worker.write(line)
+            except Exception:
+                workers.discard(worker)
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write(json.dumps({"op": "snapshot", "state": state}).encode() + b"\n")
+        workers.add(writer)
+        try:
+            while line := await reader.readline():
+                event = json.loads(line)
+                if event["op"] == "cas":
+                    room = state.setdefault(event["room"], {})
+                    ok = room.get(event["key"]) == event["expected"]
+                    if ok:
+                        #Tell everyone about the new value, then tell the sender it won
+                        room[event["key"]] = event["value"]
+                        relay(json.dumps({"op": "set", "room": event["room"], "key": event["key"], "value": event["value"]}).encode() + b"\n")
+                    writer.write(json.dumps({"op": "cas_result", "id": event["id"], "ok": ok}).encode() + b"\n")
+                    continue
+                if event["op"] == "set":
+                    state.setdefault(event["room"], {})[event["key"]] = event["value"]
+                relay(line)
+        finally:
+            workers.discard(writer)
+            writer.close()
+
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        if os.path.exists(parsed.path):
+            os.remove(parsed.path)
+        server = await asyncio.start_unix_server(handle, parsed.path)
+    else:
+        server = await asyncio.start_server(handle, parsed.hostname, parsed.port)
+    if started is not None:
+        started.set()
+    async with server:
+        await server.serve_forever()
+
+#Picked with the BACKPLANE_URL environment variable, e.g.
+#unix:///tmp/flashcard.sock or tcp://127.0.0.1:7000. Unset means one worker.
+def create_backplane(url: str | None = None) -> Backplane:
+    url = url if url is not None else os.environ.get("BACKPLANE_URL", "")
+    if not url:
+        return InProcessBackplane()
+    return SocketBackplane(url)
+
+#Start a broker: python -m core.backplane unix:///tmp/flashcard.sock
+if __name__ == "__main__":
+    asyncio.run(run_broker(sys.argv[1]))
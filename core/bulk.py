@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from typing import IO, Iterable, Iterator
+from sqlalchemy import insert
+from sqlmodel import Session, select
+from db.models import Card, Set
+
+FORMATS = ("csv", "jsonl", "tsv")
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10_000
+#Only report the first few bad rows
+MAX_ERRORS = 20
+
+@dataclass
+class ImportResult:
+    imported: int = 0
+    skipped: int = 0
+    sets_created: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    def error(self, line: int, message: str):
+        self.skipped += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f"Line {line}: {message}")
+
+#Guess the format from the file name, e.g. "deck.csv"
+def format_for(filename: str | None, default: str = "csv") -> str:
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension == "txt":
+        return "tsv"
+    return extension if extension in FORMATS else default
+
+#Each reader yields (line number, front, back, set name) one row at a time
+#from a binary file, so the upload is never held in memory all at once.
+#csv has a front,back,set header; tsv is Anki's plain text export (front,
+#back and an optional set, no header); jsonl has one object per line.
+def read_rows(file: IO[bytes], format: str) -> Iterator[tuple[int, object, object, object]]:
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if format == "jsonl":
+        for number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield number, None, None, None
+                continue
+            if not isinstance(row, dict):
+                yield number, None, None, None
+                continue
+            yield number, row.get("front"), row.get("back"), row.get("set")
+    elif format == "tsv":
+        reader = csv.reader(text, delimiter="\t")
+        for row in reader:
+            #Anki puts comments like "#separator:tab" at the top
+            if not row or row[0].startswith("#"):
+                continue
+            row = row + [None] * (3 - len(row))
+            yield reader.line_num, row[0], row[1], row[2]
+    else:
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row.get("front"), row.get("back"), row.get("set")
+
+def import_cards(session: Session, rows: Iterable[tuple[int, object, object, object]], batch_size: int = DEFAULT_BATCH_SIZE) -> ImportResult:
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    result = ImportResult()
+    #Set name -> id, filled in as we meet new names
+    sets: dict[str, int] = {}
+    batch: list[dict] = []
+
+    def set_id_for(name: str) -> int:
+        if name not in sets:
+            set_id = session.exec(select(Set.id).where(Set.name == name).limit(1)).first()
+            if set_id is None:
+                set_id = session.exec(insert(Set).values(name=name).returning(Set.id)).scalar_one()
+                result.sets_created += 1
+            sets[name] = set_id
+        return sets[name]
+
+    for number, front, back, set_name in rows:
+        if not isinstance(front, str) or not front.strip():
+            result.error(number, "front is missing")
+            continue
+        if not isinstance(back, str) or not back.strip():
+            result.error(number, "back is missing")
+            continue
+        if set_name is not None and not isinstance(set_name, str):
+            result.error(number, "set must be a name")
+            continue
+        set_name = set_name.strip() if set_name else ""
+        batch.append({"front": front.strip(), "back": back.strip(), "set_id": set_id_for(set_name) if set_name else None})
+        #One multi-row insert and one commit per batch
+        if len(batch) >= batch_size:
+            session.exec(insert(Card), params=batch)
+            session.commit()
+            result.imported += len(batch)
+            batch = []
+    if batch:
+        session.exec(insert(Card), params=batch)
+        result.imported += len(batch)
+    session.commit()
+    return result
+
+#Export rows (front, back, set name) as text, a chunk at a time. yield_per
+#keeps a server-side cursor open and only pulls a batch of rows at once.
+def export_cards(session: Session, format: str, set_id: int | None = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[str]:
+    query = select(Card.front, Card.back, Set.name).outerjoin(Set, Set.id == Card.set_id).order_by(Card.id)
+    if set_id is not None:
+        query = query.where(Card.set_id == set_id)
+    rows = session.exec(query.execution_options(yield_per=batch_size))
+
+    buffer = io.StringIO()
+    if format == "jsonl":
+        write = lambda front, back, set_name: buffer.write(json.dumps({"front": front, "back": back, "set": set_name}) + "\n")
+    else:
+        writer = csv.writer(buffer, delimiter="\t" if format == "tsv" else ",", lineterminator="\n")
+        if format == "csv":
+            writer.writerow(["front", "back", "set"])
+        write = lambda front, back, set_name: writer.writerow([front, back, set_name or ""])
+
+    for partition in rows.partitions():
+        for front, back, set_name in partition:
+            write(front, back, set_name)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,39 @@
+import threading
+from sqlmodel import Session, select
+from db.models import Set
+
+#Process-local read-through cache of every set's id and name.
+#The card pages only need the set names to fill a dropdown, so rather than
+#selecting every Set on each request we keep them here until a set route
+#changes something and calls invalidate().
+class SetCatalogue:
+
+    def __init__(self):
+        self._sets: dict[int, str] | None = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    #Returns {set id: set name}, ordered by name
+    def get(self, session: Session) -> dict[int, str]:
+        sets = self._sets
+        if sets is not None:
+            self.hits += 1
+            return sets
+        with self._lock:
+            #Another request may have filled it while we waited for the lock
+            if self._sets is None:
+                self.misses += 1
+                rows = session.exec(select(Set.id, Set.name).order_by(Set.name)).all()
+                self._sets = {id: name for id, name in rows}
+            else:
+                self.hits += 1
+            return self._sets
+
+    def invalidate(self):
+        self._sets = None
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "cached": self._sets is not None}
+
+set_catalogue = SetCatalogue()
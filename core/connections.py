@@ -0,0 +1,141 @@
+import asyncio
+import time
+from fastapi import WebSocket
+from core import protocol
+from core.metrics import ws_connections, ws_connections_total, ws_evictions, ws_broadcast_latency, ws_delivery_latency
+
+#How many frames a client may fall behind before we drop it
+MAX_QUEUE = 100
+#Broadcasts made within this long of each other share one frame
+COALESCE_SECONDS = 0.005
+#...unless this many are waiting, then they go straight away
+MAX_BATCH = 64
+
+#One connected websocket, with its own outbound queue and writer task.
+#Broadcasting only puts the message on each queue, so a slow or dead client
+#holds up nobody but itself.
+class Client:
+
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager", max_queue: int = MAX_QUEUE,
+                 encoding: str = protocol.DEFAULT_ENCODING):
+        self.websocket = websocket
+        self.manager = manager
+        self.encoding = encoding
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.task: asyncio.Task | None = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.writer())
+
+    async def writer(self):
+        try:
+            while True:
+                message, queued = await self.queue.get()
+                await self.websocket.send(message)
+                ws_delivery_latency.observe(time.perf_counter() - queued)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            #The socket is gone; the receive loop will see the disconnect too
+            self.manager.disconnect(self.websocket)
+
+    #Returns False when the client is too far behind to take another message
+    def push(self, message: dict, queued: float | None = None) -> bool:
+        try:
+            self.queue.put_nowait((message, queued if queued is not None else time.perf_counter()))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+##Websockets
+class ConnectionManager:
+
+    def __init__(self, max_queue: int = MAX_QUEUE, coalesce: float = COALESCE_SECONDS):
+        self.active_connections: dict[WebSocket, Client] = {}
+        self.max_queue = max_queue
+        self.coalesce = coalesce
+        self.evicted = 0
+        #Broadcasts waiting for the rest of their batch
+        self.pending: list[dict] = []
+        self.pending_since = 0.0
+        self.timer: asyncio.TimerHandle | None = None
+
+    #Establish a connection, add it to the list
+    async def connect(self, websocket: WebSocket, encoding: str = protocol.DEFAULT_ENCODING):
+        await websocket.accept()
+        self.register(websocket, encoding)
+
+    #Add an already accepted websocket to the list
+    def register(self, websocket: WebSocket, encoding: str = protocol.DEFAULT_ENCODING):
+        client = Client(websocket, self, self.max_queue, encoding)
+        self.active_connections[websocket] = client
+        client.start()
+        ws_connections.inc()
+        ws_connections_total.inc()
+
+    #When disconnecting, remove websocket from the list and stop its writer.
+    #Safe to call more than once for the same socket.
+    def disconnect(self, websocket: WebSocket):
+        client = self.active_connections.pop(websocket, None)
+        if client is not None:
+            ws_connections.dec()
+        if client is not None and client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    #Disconnect a client that can't keep up
+    def evict(self, websocket: WebSocket):
+        self.evicted += 1
+        ws_evictions.inc()
+        self.disconnect(websocket)
+        asyncio.create_task(self._close(websocket))
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=1008, reason="Too slow")
+        except Exception:
+            pass
+
+    #Send message to a particluar socket. Anything already broadcast goes
+    #first, so the client sees things in the order they happened.
+    async def send_personal_message(self, message, websocket: WebSocket):
+        self.flush()
+        client = self.active_connections.get(websocket)
+        if client is None:
+            return
+        for frame in protocol.encode([protocol.normalize(message)], client.encoding):
+            if not client.push(frame):
+                self.evict(websocket)
+                return
+
+    #Brodcast Message to all sockets. It waits up to `coalesce` seconds for
+    #company, then flush() sends the lot as one frame.
+    async def broadcast(self, message):
+        if not self.pending:
+            self.pending_since = time.perf_counter()
+        self.pending.append(protocol.normalize(message))
+        if self.coalesce <= 0 or len(self.pending) >= MAX_BATCH:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.coalesce, self.flush)
+
+    #Each frame is built once per encoding and shared by every client's
+    #queue, and nothing here waits on a socket
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return
+        start = time.perf_counter()
+        messages, queued = protocol.compact(self.pending), self.pending_since
+        self.pending = []
+        frames: dict[str, list[dict]] = {}
+        for websocket, client in list(self.active_connections.items()):
+            encoded = frames.get(client.encoding)
+            if encoded is None:
+                encoded = frames[client.encoding] = protocol.encode(messages, client.encoding)
+            for frame in encoded:
+                if not client.push(frame, queued):
+                    self.evict(websocket)
+                    break
+        ws_broadcast_latency.observe(time.perf_counter() - start)
@@ -0,0 +1,124 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Callable
+from fastapi import Request, Response
+from fastapi.responses import HTMLResponse
+from sqlmodel import Session, select
+from db.models import ContentVersion
+from core.templates import TEMPLATES_DIR
+
+PAGE_CACHE_SIZE = 256
+
+#Part of every ETag, so a deploy that changes a template doesn't answer
+#"304 Not Modified" with pages built from the old one. It's the same in
+#every worker, so a browser can revalidate against any of them.
+def templates_digest(directory: Path = TEMPLATES_DIR) -> str:
+    digest = hashlib.sha1()
+    for path in sorted(directory.rglob("*.html")):
+        digest.update(str(path.relative_to(directory)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+TEMPLATES_DIGEST = templates_digest()
+
+#Returns ({name: version}, last modified as a unix time) for the counters in db/versions.py
+def content_versions(session: Session, names: tuple[str, ...]) -> tuple[dict[str, int], float]:
+    rows = session.exec(select(ContentVersion).where(ContentVersion.name.in_(names))).all()
+    versions = {name: 0 for name in names}
+    updated = 0.0
+    for row in rows:
+        versions[row.name] = row.version
+        updated = max(updated, row.updated)
+    return versions, updated
+
+#Process-local LRU of rendered pages, keyed by their ETag. An ETag changes
+#whenever anything on the page could have, so entries never need
+#invalidating; old ones just fall off the end.
+class PageCache:
+
+    def __init__(self, maxsize: int = PAGE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._pages: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def get(self, etag: str) -> bytes | None:
+        with self._lock:
+            body = self._pages.get(etag)
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._pages.move_to_end(etag)
+            return body
+
+    def put(self, etag: str, body: bytes):
+        with self._lock:
+            self._pages[etag] = body
+            self._pages.move_to_end(etag)
+            while len(self._pages) > self.maxsize:
+                self._pages.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits, "misses": self.misses, "not_modified": self.not_modified,
+            "evictions": self.evictions, "size": len(self._pages), "maxsize": self.maxsize,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+page_cache = PageCache()
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+def not_modified_since(header: str | None, updated: float) -> bool:
+    if not header or not updated:
+        return False
+    try:
+        return int(updated) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+#Conditional GET for an html page that only depends on the url and the given
+#version counters ("card", "set", "set:<id>"). A matching If-None-Match (or
+#If-Modified-Since) gets an empty 304, a page we've rendered before comes
+#from page_cache, and only otherwise is render() called to build the
+#TemplateResponse. Either way it costs one small query for the versions.
+def cached_page(request: Request, session: Session, names: tuple[str, ...],
+                render: Callable[[], Response], cache: PageCache = page_cache) -> Response:
+    versions, updated = content_versions(session, names)
+    key = "|".join([TEMPLATES_DIGEST, str(request.url), *(f"{name}={version}" for name, version in versions.items())])
+    etag = '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if updated:
+        headers["Last-Modified"] = formatdate(updated, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if etag_matches(if_none_match, etag) or (
+            if_none_match is None and not_modified_since(request.headers.get("if-modified-since"), updated)):
+        cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    body = cache.get(etag)
+    if body is None:
+        response = render()
+        if response.status_code != 200:
+            return response
+        body = response.body
+        cache.put(etag, body)
+    return HTMLResponse(body, headers=headers)
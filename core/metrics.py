@@ -0,0 +1,198 @@
+import contextvars
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+from sqlalchemy import event
+
+#Just enough of a Prometheus client for /metrics: counters, gauges and
+#histograms with labels, rendered in the text exposition format.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines += self.render_value(key, value)
+        return lines
+
+    def render_value(self, key: tuple, value) -> list[str]:
+        return [f"{self.name}{format_labels(self.labels, key)} {value}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self.key(labels), 0)
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self.key(labels)] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                #One count per bucket, then the sum and the total count
+                counts = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def count(self, **labels) -> int:
+        counts = self._values.get(self.key(labels))
+        return counts[-1] if counts else 0
+
+    def render_value(self, key: tuple, counts) -> list[str]:
+        lines = []
+        for bound, count in zip([*self.buckets, "+Inf"], [*counts[:-2], counts[-1]]):
+            le = 'le="%s"' % bound
+            lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {count}")
+        lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {counts[-2]}")
+        lines.append(f"{self.name}_count{format_labels(self.labels, key)} {counts[-1]}")
+        return lines
+
+class Registry:
+
+    def __init__(self):
+        self.metrics: list[Metric] = []
+        #Called before every render, to copy in numbers kept elsewhere
+        self.collectors: list[Callable[[], None]] = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        for collect in self.collectors:
+            collect()
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests = registry.add(Counter("http_requests_total", "HTTP requests", ("method", "route", "status")))
+http_latency = registry.add(Histogram("http_request_duration_seconds", "Time to serve an HTTP request", ("method", "route")))
+http_in_progress = registry.add(Gauge("http_requests_in_progress", "HTTP requests being served"))
+http_db_queries = registry.add(Histogram("http_request_db_queries", "SQL statements run per HTTP request", ("route",), COUNT_BUCKETS))
+db_queries = registry.add(Counter("db_queries_total", "SQL statements run"))
+db_latency = registry.add(Histogram("db_query_duration_seconds", "Time to run one SQL statement"))
+template_latency = registry.add(Histogram("template_render_seconds", "Time to render a Jinja template", ("template",)))
+ws_connections = registry.add(Gauge("ws_connections", "Open websocket connections"))
+ws_connections_total = registry.add(Counter("ws_connections_total", "Websocket connections accepted"))
+ws_evictions = registry.add(Counter("ws_evictions_total", "Websocket clients dropped for falling behind"))
+ws_broadcast_latency = registry.add(Histogram("ws_broadcast_seconds", "Time to queue one broadcast for every client in a room"))
+ws_delivery_latency = registry.add(Histogram("ws_delivery_seconds", "Time from queueing a websocket message to sending it"))
+
+#Queries and query time for the request being served, see MetricsMiddleware
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_seconds: float = 0.0
+
+current_request: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar("current_request", default=None)
+
+#Time every statement an engine runs (sync or async engine)
+def instrument_engine(engine):
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        db_queries.inc()
+        db_latency.observe(elapsed)
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+    return engine
+
+#Pure ASGI, so unlike BaseHTTPMiddleware it adds no task or stream per
+#request and leaves streaming responses and websockets alone. Requests are
+#labelled with their route's path template ("/cards/{id}"), not the url,
+#so there's one series per route.
+class MetricsMiddleware:
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        http_in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish = time.perf_counter()
+            current_request.reset(token)
+            http_in_progress.dec()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            http_requests.inc(method=method, route=route, status=status)
+            http_latency.observe(finish - start, method=method, route=route)
+            http_db_queries.observe(stats.queries, route=route)
+            if self.profiler is not None and self.profiler.running:
+                self.profiler.record(f"{method} {route}", start, finish)
@@ -0,0 +1,74 @@
+import base64
+import json
+from dataclasses import dataclass
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlmodel import Session
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+@dataclass
+class Page:
+    items: list
+    next: str | None = None
+    prev: str | None = None
+
+#Cursors are the sort key of the first/last row on a page, as url-safe base64 json
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def page_size(limit: int | None) -> int:
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+#Keyset ("seek") pagination: instead of OFFSET we continue from the sort key
+#of the last row we showed, so every page is an index range scan no matter
+#how deep into the list we are. `columns` is the sort key, ending in a
+#unique column (the id) so rows with the same name keep a stable order.
+def keyset_page(session: Session, query, columns, after: str | None = None,
+                before: str | None = None, limit: int | None = None) -> Page:
+    limit = page_size(limit)
+    key = tuple_(*columns)
+
+    if before is not None:
+        query = query.where(key < tuple_(*decode_cursor(before, len(columns))))
+        query = query.order_by(*[column.desc() for column in columns])
+    else:
+        if after is not None:
+            query = query.where(key > tuple_(*decode_cursor(after, len(columns))))
+        query = query.order_by(*columns)
+
+    #Fetch one extra row to find out whether there is another page
+    items = list(session.exec(query.limit(limit + 1)).all())
+    more = len(items) > limit
+    items = items[:limit]
+
+    def cursor(item):
+        return encode_cursor([getattr(item, column.key) for column in columns])
+
+    page = Page(items=items)
+    if before is not None:
+        items.reverse()
+        if items:
+            page.next = cursor(items[-1])
+            if more:
+                page.prev = cursor(items[0])
+    elif items:
+        if more:
+            page.next = cursor(items[-1])
+        if after is not None:
+            page.prev = cursor(items[0])
+    return page
@@ -0,0 +1,84 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+
+#Opt-in sampling profiler for slow requests. Set PROFILE_SLOW_REQUESTS to a
+#number of seconds and a background thread samples every thread's stack
+#every few milliseconds. When a request takes longer than that, the samples
+#taken while it ran are kept as "folded" stacks ("a;b;c 12" per line), which
+#flamegraph.pl or https://www.speedscope.app draw as a flame graph. Samples
+#come from every thread, so requests served at the same time show up in
+#each other's profiles.
+PROFILE_SLOW_REQUESTS = float(os.environ.get("PROFILE_SLOW_REQUESTS", 0))
+SAMPLE_INTERVAL = 0.005
+KEEP_PROFILES = 20
+#How far back samples are kept, so the longest request we can profile
+WINDOW_SECONDS = 30
+
+#Innermost frames of a thread that's just waiting for work
+IDLE = {("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get"), ("thread.py", "_worker")}
+
+def fold(frame) -> str | None:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{Path(code.co_filename).name}:{code.co_name}")
+        frame = frame.f_back
+    if tuple(names[0].split(":", 1)) in IDLE:
+        return None
+    return ";".join(reversed(names))
+
+class SlowRequestProfiler:
+
+    def __init__(self, threshold: float = PROFILE_SLOW_REQUESTS, interval: float = SAMPLE_INTERVAL, keep: int = KEEP_PROFILES):
+        self.threshold = threshold
+        self.interval = interval
+        self.samples: deque[tuple[float, str]] = deque()
+        self.profiles: deque[dict] = deque(maxlen=keep)
+        self.thread: threading.Thread | None = None
+        self.running = False
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.sample, name="slow-request-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def sample(self):
+        me = threading.get_ident()
+        while self.running:
+            now = time.perf_counter()
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    stack = fold(frame)
+                    if stack is not None:
+                        self.samples.append((now, stack))
+            while self.samples and self.samples[0][0] < now - WINDOW_SECONDS:
+                self.samples.popleft()
+            time.sleep(self.interval)
+
+    #Called by MetricsMiddleware after every request
+    def record(self, name: str, started: float, finished: float):
+        duration = finished - started
+        if duration < self.threshold:
+            return
+        stacks = Counter(stack for at, stack in list(self.samples) if started <= at <= finished)
+        self.profiles.append({
+            "request": name,
+            "seconds": round(duration, 4),
+            "at": time.time(),
+            "samples": sum(stacks.values()),
+            "folded": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()),
+        })
+
+profiler = SlowRequestProfiler()
@@ -0,0 +1,115 @@
+import orjson
+
+#msgpack is optional: without it clients that ask for it get json instead
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+#The websocket protocol. Everything the server sends is a typed message:
+#  {"t": "chat", "from": "alice", "text": "hello"}
+#  {"t": "question", "round": 3, "text": "Capital of France?", "ends": 1700000000.0}
+#  {"t": "result", "round": 3, "winner": "alice", "answer": "Paris"}   (winner is None when time ran out)
+#  {"t": "presence", "players": ["alice", "bob"]}                     (full list, only sent to whoever just joined)
+#  {"t": "presence", "join": ["carol"], "leave": ["bob"]}             (changes since then)
+#  {"t": "system", "text": "Slow down!"}
+#Messages produced within a few ms of each other go out together in one
+#frame, {"v": 1, "m": [message, ...]}, as json text or as msgpack bytes.
+#"text" is the old protocol: one plain string per frame, for older clients.
+VERSION = 1
+ENCODINGS = ("json", "msgpack", "text")
+DEFAULT_ENCODING = "json"
+
+def chat(sender: str, text: str) -> dict:
+    return {"t": "chat", "from": sender, "text": text}
+
+def question(round: dict) -> dict:
+    return {"t": "question", "round": round["number"], "text": round["card"]["front"], "ends": round["ends"]}
+
+def result(round: dict, winner: str | None = None) -> dict:
+    return {"t": "result", "round": round["number"], "winner": winner, "answer": round["card"]["back"]}
+
+def presence(players: list[str] | None = None, join: list[str] = (), leave: list[str] = ()) -> dict:
+    if players is not None:
+        return {"t": "presence", "players": list(players)}
+    message = {"t": "presence"}
+    if join:
+        message["join"] = list(join)
+    if leave:
+        message["leave"] = list(leave)
+    return message
+
+def system(text: str) -> dict:
+    return {"t": "system", "text": text}
+
+#Plain strings are system messages
+def normalize(message) -> dict:
+    return system(message) if isinstance(message, str) else message
+
+#An unknown or unavailable encoding falls back to json; the client can tell
+#from the frame type (text or binary) what it got
+def choose_encoding(name: str | None) -> str:
+    if name not in ENCODINGS or (name == "msgpack" and msgpack is None):
+        return DEFAULT_ENCODING
+    return name
+
+#Merge the presence deltas in a batch into one, in place of the first. A
+#player who joins and leaves again inside the batch cancels out.
+def compact(messages: list) -> list:
+    first = None
+    joined: dict[str, None] = {}
+    left: dict[str, None] = {}
+    compacted = []
+    for message in messages:
+        if message.get("t") != "presence" or "players" in message:
+            compacted.append(message)
+            continue
+        for player in message.get("join", ()):
+            if player in left:
+                del left[player]
+            else:
+                joined[player] = None
+        for player in message.get("leave", ()):
+            if player in joined:
+                del joined[player]
+            else:
+                left[player] = None
+        if first is None:
+            first = len(compacted)
+            compacted.append(None)
+    if first is not None:
+        delta = presence(join=list(joined), leave=list(left))
+        if len(delta) > 1:
+            compacted[first] = delta
+        else:
+            del compacted[first]
+    return compacted
+
+#The old text protocol: each message as the strings it used to be sent as.
+#Joins and player lists didn't exist there, so they send nothing.
+def as_text(message: dict) -> list[str]:
+    kind = message.get("t")
+    if kind == "chat":
+        return [f"{message['from']} says: {message['text']}"]
+    if kind == "question":
+        return ["Triva Question!", message["text"]]
+    if kind == "result":
+        if message["winner"] is None:
+            return [f"Time's up! The answer was: {message['answer']}"]
+        return [f"Correct Answer! {message['winner']} correctly guessed the answer: {message['answer']}"]
+    if kind == "presence":
+        return [f"Client #{player} left the chat" for player in message.get("leave", ())]
+    return [message["text"]]
+
+#The ASGI send events for a batch of messages in the given encoding
+def encode(messages: list[dict], encoding: str = DEFAULT_ENCODING) -> list[dict]:
+    if encoding == "text":
+        return [{"type": "websocket.send", "text": text} for message in messages for text in as_text(message)]
+    frame = {"v": VERSION, "m": messages}
+    if encoding == "msgpack":
+        return [{"type": "websocket.send", "bytes": msgpack.packb(frame)}]
+    return [{"type": "websocket.send", "text": orjson.dumps(frame).decode()}]
+
+def decode(data: str | bytes) -> list[dict]:
+    frame = msgpack.unpackb(data) if isinstance(data, bytes) else orjson.loads(data)
+    return frame["m"]
@@ -0,0 +1,93 @@
+import ipaddress
+import os
+import re
+
+#Proxies whose X-Forwarded-* headers we believe, as comma separated IPs or
+#networks ("10.0.0.0/8"), or "*" for any. Same variable uvicorn uses. Railway's
+#edge doesn't have fixed addresses, so the default trusts every peer like
+#the old middleware did; set it to lock things down elsewhere.
+FORWARDED_ALLOW_IPS = os.environ.get("FORWARDED_ALLOW_IPS", "*")
+
+SCHEMES = {
+    "http": {"http": "http", "https": "https"},
+    "websocket": {"http": "ws", "https": "wss", "ws": "ws", "wss": "wss"},
+}
+#host or host:port, nothing that could smuggle a path or a second header
+HOST = re.compile(r"^[A-Za-z0-9.\-]+(:\d{1,5})?$|^\[[0-9A-Fa-f:.]+\](:\d{1,5})?$")
+
+def split_host(host: str) -> tuple[str, int | None]:
+    if host.startswith("["):
+        name, _, port = host.partition("]")
+        name, port = name + "]", port.lstrip(":")
+    else:
+        name, _, port = host.partition(":")
+    return name, int(port) if port else None
+
+class TrustedProxies:
+
+    def __init__(self, allow: str = FORWARDED_ALLOW_IPS):
+        entries = [entry.strip() for entry in allow.split(",") if entry.strip()]
+        self.any = "*" in entries
+        self.networks = [ipaddress.ip_network(entry, strict=False) for entry in entries if entry != "*"]
+
+    def __contains__(self, host: str | None) -> bool:
+        if self.any:
+            return True
+        try:
+            address = ipaddress.ip_address(host)
+        except (TypeError, ValueError):
+            return False
+        return any(address in network for network in self.networks)
+
+#Trust Railway's proxy headers: the browser talked https to the proxy, so
+#url_for should build https links and the websocket scheme is wss.
+#
+#A plain ASGI middleware rather than BaseHTTPMiddleware: it only rewrites
+#the scope and passes the same receive/send through, so there's no extra
+#task or stream per request, streaming responses are untouched and
+#websockets get the same treatment as http.
+class ProxyHeadersMiddleware:
+
+    def __init__(self, app, trusted: str = FORWARDED_ALLOW_IPS):
+        self.app = app
+        self.trusted = TrustedProxies(trusted)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in SCHEMES:
+            client = scope.get("client")
+            if client is None or client[0] in self.trusted:
+                self.forwarded(scope)
+        return await self.app(scope, receive, send)
+
+    def forwarded(self, scope):
+        proto = host = forwarded_for = None
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-proto":
+                proto = value.decode("latin-1").split(",")[0].strip().lower()
+            elif name == b"x-forwarded-host":
+                host = value.decode("latin-1").split(",")[0].strip()
+            elif name == b"x-forwarded-for":
+                forwarded_for = value.decode("latin-1")
+        if proto is None and host is None and forwarded_for is None:
+            return
+
+        #Changed in place, like the router does, so outer middleware sees it too
+        scheme = SCHEMES[scope["type"]].get(proto)
+        if scheme is not None:
+            scope["scheme"] = scheme
+        if host is not None and HOST.match(host):
+            headers = [(name, value) for name, value in scope["headers"] if name != b"host"]
+            headers.append((b"host", host.encode("latin-1")))
+            scope["headers"] = headers
+            scope["server"] = split_host(host)
+        if forwarded_for:
+            #The nearest address we don't trust is the real client
+            port = scope["client"][1] if scope.get("client") else 0
+            for address in reversed([part.strip() for part in forwarded_for.split(",")]):
+                if address and address not in self.trusted:
+                    scope["client"] = (address, port)
+                    break
+            else:
+                first = forwarded_for.split(",")[0].strip()
+                if first:
+                    scope["client"] = (first, port)
@@ -0,0 +1,37 @@
+import gzip
+import orjson
+from fastapi import Request, Response
+
+#brotli is optional: without it clients that ask for br get gzip instead
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#Below this compressing costs more than it saves
+MIN_COMPRESS_SIZE = 500
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+def accepted_encodings(header: str | None) -> set[str]:
+    encodings = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0"):
+            encodings.add(name.strip().lower())
+    return encodings
+
+#JSON straight to bytes with orjson, skipping pydantic, then compressed with
+#brotli or gzip if the client accepts it and the body is worth it
+def json_response(request: Request, data, status_code: int = 200) -> Response:
+    body = orjson.dumps(data)
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= MIN_COMPRESS_SIZE:
+        accepted = accepted_encodings(request.headers.get("accept-encoding"))
+        if brotli is not None and "br" in accepted:
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
@@ -0,0 +1,110 @@
+from fastapi import WebSocket
+from core import protocol
+from core.backplane import Backplane, InProcessBackplane
+from core.connections import ConnectionManager
+from core.trivia import TriviaManager
+from core.rounds import RoundScheduler
+from core.scores import ScoreBoard
+from db.session import new_async_session
+
+DEFAULT_ROOM = "lobby"
+
+#A game room: its own players, chat, trivia question and round timer.
+#Broadcasts go through the backplane so players in the same room on other
+#workers see them too.
+class Room:
+
+    def __init__(self, room_id: str, rooms: "RoomManager", set_id: int | None = None):
+        self.id = room_id
+        self.backplane = rooms.backplane
+        self.scoreboard = rooms.scoreboard
+        #Another worker may already be playing this room with a set
+        if set_id is None:
+            set_id = self.backplane.get_state(room_id, "set_id")
+        self.set_id = set_id
+        self.manager = ConnectionManager()
+        self.trivia = TriviaManager(self, set_id)
+        self.rounds = RoundScheduler(self, rooms.session_factory)
+
+    def __len__(self):
+        return len(self.manager.active_connections)
+
+    async def broadcast(self, message):
+        await self.backplane.publish(self.id, message)
+
+    async def set_state(self, key: str, value):
+        await self.backplane.set_state(self.id, key, value)
+
+    async def compare_and_set(self, key: str, expected, value) -> bool:
+        return await self.backplane.compare_and_set(self.id, key, expected, value)
+
+    def get_state(self, key: str, default=None):
+        return self.backplane.get_state(self.id, key, default)
+
+    #Who's in the room on any worker, as {player: open connections}, so a
+    #player with two tabs open only leaves when they close both
+    @property
+    def players(self) -> dict[str, int]:
+        return self.get_state("players") or {}
+
+    #Count a connection in or out. Returns whether that player arrived or
+    #left altogether, which is when the room hears about it.
+    async def count_player(self, player: str, change: int) -> bool:
+        while True:
+            current = self.get_state("players")
+            players = dict(current or {})
+            count = players.get(player, 0) + change
+            if count > 0:
+                players[player] = count
+            else:
+                players.pop(player, None)
+            if await self.compare_and_set("players", current, players):
+                return count == (1 if change > 0 else 0)
+
+#Rooms are created when the first player joins and thrown away when the
+#last one leaves, so a broadcast only ever reaches the players in one room
+class RoomManager:
+
+    def __init__(self, backplane: Backplane | None = None, scoreboard: ScoreBoard | None = None, session_factory=new_async_session):
+        self.rooms: dict[str, Room] = {}
+        self.backplane = backplane if backplane is not None else InProcessBackplane()
+        self.scoreboard = scoreboard if scoreboard is not None else ScoreBoard()
+        #Where the round schedulers get their database sessions
+        self.session_factory = session_factory
+        self.backplane.deliver = self.deliver
+
+    #The set is only used when the room is created; later players join
+    #whatever the room is already playing. A named player gets the list of
+    #who's there, and everyone else hears that they joined.
+    async def join(self, room_id: str, websocket: WebSocket, set_id: int | None = None,
+                   player: str | None = None, encoding: str = protocol.DEFAULT_ENCODING) -> Room:
+        await websocket.accept()
+        #No awaits until it's registered, so the room can't be torn down under us
+        room = self.rooms.get(room_id)
+        if room is None:
+            room = self.rooms[room_id] = Room(room_id, self, set_id)
+        room.manager.register(websocket, encoding)
+        if room.set_id is not None and room.get_state("set_id") is None:
+            await room.set_state("set_id", room.set_id)
+        if player is not None:
+            arrived = await room.count_player(player, 1)
+            await room.manager.send_personal_message(protocol.presence(players=sorted(room.players)), websocket)
+            if arrived:
+                await room.broadcast(protocol.presence(join=[player]))
+        return room
+
+    async def leave(self, room: Room, websocket: WebSocket, player: str | None = None):
+        room.manager.disconnect(websocket)
+        if player is not None and await room.count_player(player, -1):
+            await room.broadcast(protocol.presence(leave=[player]))
+        if len(room) == 0 and self.rooms.get(room.id) is room:
+            del self.rooms[room.id]
+            room.rounds.stop()
+            self.backplane.forget(room.id)
+
+    #A message for a room arrived from the backplane; hand it to our players
+    #in that room, if we have any
+    async def deliver(self, room_id: str, message):
+        room = self.rooms.get(room_id)
+        if room is not None:
+            await room.manager.broadcast(message)
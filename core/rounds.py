@@ -0,0 +1,86 @@
+import asyncio
+import time
+from core import protocol
+
+#Seconds players get to answer a question
+ROUND_SECONDS = 30
+#Pause between the end of a round and the next question
+BREAK_SECONDS = 5
+#A player can only skip to a new question once it has been up this long
+NEXT_QUESTION_COOLDOWN = 3
+
+#Runs the trivia game for one room: asks a question, waits for a winner or
+#for time to run out, takes a short break and goes again. The first
+#nextQuestion request starts it; it stops when the room is torn down.
+#
+#With several workers every worker runs one of these for the room, but new
+#questions and "time's up" both go through compare_and_set on the round,
+#so only one worker's timer actually does anything each time.
+class RoundScheduler:
+
+    def __init__(self, room, session_factory):
+        self.room = room
+        self.session_factory = session_factory
+        self.wake = asyncio.Event()
+        self.round_over = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    #A player asked for the next question. Returns False if it's too soon.
+    def request_next(self) -> bool:
+        round = self.room.get_state("round")
+        if round is not None and time.time() - round["started"] < NEXT_QUESTION_COOLDOWN:
+            return False
+        self.start()
+        self.wake.set()
+        self.round_over.set()
+        return True
+
+    #Someone on this worker won the round
+    def end_round(self):
+        self.round_over.set()
+
+    async def run(self):
+        while True:
+            self.wake.clear()
+            self.round_over.clear()
+            await self.next_question()
+            round = self.room.get_state("round")
+            if round is None:
+                #No cards to ask about; wait until someone asks again
+                await self.wake.wait()
+                continue
+            try:
+                await asyncio.wait_for(self.round_over.wait(), max(0, round["ends"] - time.time()))
+            except TimeoutError:
+                await self.expire(round)
+            if not self.wake.is_set():
+                try:
+                    await asyncio.wait_for(self.wake.wait(), BREAK_SECONDS)
+                except TimeoutError:
+                    pass
+
+    async def next_question(self):
+        async with self.session_factory() as session:
+            question = await self.room.trivia.get_trivia(session)
+        #None means another worker drew this round's question
+        if question is not None:
+            round = self.room.get_state("round")
+            await self.room.broadcast(protocol.question(round) if round is not None else protocol.system(question))
+
+    async def expire(self, round: dict):
+        #Make sure the round we timed is still the current one
+        current = self.room.get_state("round")
+        if current is None or current["number"] != round["number"] or current.get("over"):
+            return
+        round = current
+        if await self.room.compare_and_set("round", round, dict(round, over=True)):
+            await self.room.broadcast(protocol.result(round))
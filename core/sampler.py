@@ -0,0 +1,26 @@
+import random
+from sqlmodel import Session, select, func
+from db.models import Card
+
+#Pick a random card without loading the whole table.
+#We pick a random id between the smallest and largest id and take the first
+#card at or after it. Both queries walk the primary key (or the set_id index
+#when scoped to a set), so the cost does not grow with the number of cards.
+#Cards that sit right after a gap in the ids are picked a little more often.
+def random_card(session: Session, set_id: int | None = None) -> Card | None:
+    #SQLite only uses the index for a lone min() or max(), so ask for each
+    #one in its own subquery
+    low = select(func.min(Card.id))
+    high = select(func.max(Card.id))
+    if set_id is not None:
+        low = low.where(Card.set_id == set_id)
+        high = high.where(Card.set_id == set_id)
+    low, high = session.exec(select(low.scalar_subquery(), high.scalar_subquery())).one()
+    if low is None:
+        return None
+
+    pick = random.randint(low, high)
+    query = select(Card).where(Card.id >= pick)
+    if set_id is not None:
+        query = query.where(Card.set_id == set_id)
+    return session.exec(query.order_by(Card.id).limit(1)).first()
@@ -0,0 +1,71 @@
+import asyncio
+import heapq
+from operator import itemgetter
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db.models import Score
+
+#How often points are written to the database
+FLUSH_SECONDS = 10
+
+#Trivia scores kept in memory. Points are added here as players win rounds
+#and the leaderboard is read straight from memory; the database only sees
+#one batched upsert every FLUSH_SECONDS rather than a write per guess.
+class ScoreBoard:
+
+    def __init__(self):
+        self.scores: dict[str, int] = {}
+        #Points not written to the database yet
+        self.pending: dict[str, int] = {}
+        self.task: asyncio.Task | None = None
+
+    def add(self, player: str, points: int = 1):
+        self.scores[player] = self.scores.get(player, 0) + points
+        self.pending[player] = self.pending.get(player, 0) + points
+
+    def top(self, limit: int = 10) -> list[dict]:
+        best = heapq.nlargest(limit, self.scores.items(), key=itemgetter(1))
+        return [{"player": player, "score": score} for player, score in best]
+
+    #Start from what's already saved (plus anything not yet flushed)
+    async def load(self, session: AsyncSession):
+        rows = await session.exec(select(Score.player, Score.score))
+        self.scores = {player: score for player, score in rows.all()}
+        for player, points in self.pending.items():
+            self.scores[player] = self.scores.get(player, 0) + points
+
+    async def flush(self, session: AsyncSession):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        statement = insert(Score).values([{"player": player, "score": points} for player, points in pending.items()])
+        statement = statement.on_conflict_do_update(
+            index_elements=[Score.player], set_={"score": Score.score + statement.excluded.score}
+        )
+        try:
+            await session.exec(statement)
+            await session.commit()
+        except Exception:
+            #Keep the points for the next try
+            for player, points in pending.items():
+                self.pending[player] = self.pending.get(player, 0) + points
+            raise
+
+    async def run(self, session_factory, interval: float = FLUSH_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with session_factory() as session:
+                    await self.flush(session)
+            except Exception as e:
+                print(f"Could not save scores: {e}")
+
+    def start(self, session_factory):
+        self.task = asyncio.create_task(self.run(session_factory))
+
+    async def stop(self, session_factory):
+        if self.task is not None:
+            self.task.cancel()
+        async with session_factory() as session:
+            await self.flush(session)
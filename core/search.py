@@ -0,0 +1,36 @@
+import re
+from sqlalchemy import column, table, text
+from sqlalchemy.orm import joinedload
+from sqlmodel import Session, select
+from db.models import Card
+
+DEFAULT_RESULTS = 20
+MAX_RESULTS = 100
+
+card_fts = table("card_fts", column("rowid"), column("rank"))
+
+#Turn what the user typed into an FTS5 query: every word has to appear, and
+#each one matches as a prefix ("photo" finds "photosynthesis"). Quoting the
+#words stops FTS5 reading things like AND, NOT or "-" as operators.
+def fts_query(text: str) -> str | None:
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+#Best matches first (FTS5's bm25 rank), optionally only from one set
+def search_cards(session: Session, text_query: str, set_id: int | None = None, limit: int = DEFAULT_RESULTS) -> list[Card]:
+    match = fts_query(text_query)
+    if match is None:
+        return []
+    query = (
+        select(Card)
+        .options(joinedload(Card.set))
+        .join(card_fts, card_fts.c.rowid == Card.id)
+        .where(text("card_fts MATCH :match").bindparams(match=match))
+        .order_by(card_fts.c.rank)
+        .limit(max(1, min(limit, MAX_RESULTS)))
+    )
+    if set_id is not None:
+        query = query.where(Card.set_id == set_id)
+    return list(session.exec(query).all())
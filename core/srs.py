@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+from sqlmodel import Session, select, func
+from db.models import Card, Review
+
+#The answer buttons on the learn page and the SM-2 quality each one means
+GRADES = {"again": 1, "hard": 3, "good": 4, "easy": 5}
+
+#Forgotten cards come back this soon, rather than tomorrow
+RELEARN = timedelta(minutes=10)
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+#SM-2: work out the card's next interval (in days) and ease from how well
+#the user remembered it, quality being 0 (blank) to 5 (perfect)
+def schedule(review: Review, quality: int, now: datetime):
+    if quality < 3:
+        review.repetitions = 0
+        review.interval = 0
+        review.due = now + RELEARN
+    else:
+        review.repetitions += 1
+        if review.repetitions == 1:
+            review.interval = 1
+        elif review.repetitions == 2:
+            review.interval = 6
+        else:
+            review.interval = round(review.interval * review.ease)
+        review.due = now + timedelta(days=review.interval)
+    review.ease = max(1.3, review.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+#The card this user should study next: the most overdue card they have
+#already seen, or else the next card they haven't seen yet. Each step is a
+#walk down an index, so it doesn't slow down as cards and reviews pile up.
+def next_card(session: Session, user: str, set_id: int | None = None, now: datetime | None = None) -> Card | None:
+    now = now or utcnow()
+    due = (
+        select(Card)
+        .join(Review, Review.card_id == Card.id)
+        .where(Review.user == user, Review.due <= now)
+        .order_by(Review.due)
+    )
+    if set_id is not None:
+        due = due.where(Card.set_id == set_id)
+    card = session.exec(due.limit(1)).first()
+    if card is not None:
+        return card
+
+    #New cards are handed out in id order, so the next one is usually just
+    #past the newest card this user has reviewed
+    seen = select(func.max(Review.card_id)).where(Review.user == user).scalar_subquery()
+    card = session.exec(new_cards(set_id).where(Card.id > func.coalesce(seen, 0)).limit(1)).first()
+    if card is not None:
+        return card
+    #Studying one set and then another can leave unseen cards behind the
+    #newest one, so as a last resort look for any card without a review
+    unseen = ~select(Review.id).where(Review.user == user, Review.card_id == Card.id).exists()
+    return session.exec(new_cards(set_id).where(unseen).limit(1)).first()
+
+def new_cards(set_id: int | None):
+    query = select(Card)
+    if set_id is not None:
+        query = query.where(Card.set_id == set_id)
+    return query.order_by(Card.id)
+
+def record_review(session: Session, user: str, card_id: int, quality: int, now: datetime | None = None) -> Review:
+    now = now or utcnow()
+    review = session.exec(select(Review).where(Review.user == user, Review.card_id == card_id)).first()
+    if review is None:
+        review = Review(user=user, card_id=card_id, due=now)
+    schedule(review, quality, now)
+    session.add(review)
+    session.commit()
+    return review
@@ -1,4 +1,45 @@
+import os
+import sys
+import time
+from pathlib import Path
+from jinja2 import FileSystemBytecodeCache
 from fastapi.templating import Jinja2Templates
+from core.metrics import template_latency
+
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates"
+#Compiled templates are kept here between restarts, so a new process only has
+#to load them rather than parse and compile them again. Defaults to a folder
+#in the system temp directory.
+TEMPLATE_CACHE_DIR = os.environ.get("TEMPLATE_CACHE_DIR")
+
+#Jinja2Templates that times every render for /metrics
+class TimedTemplates(Jinja2Templates):
+
+    def TemplateResponse(self, *args, **kwargs):
+        start = time.perf_counter()
+        response = super().TemplateResponse(*args, **kwargs)
+        template_latency.observe(time.perf_counter() - start, template=response.template.name)
+        return response
 
 # Configure Jinja2 templates directory
-templates = Jinja2Templates(directory="templates")
+templates = TimedTemplates(directory=TEMPLATES_DIR)
+if TEMPLATE_CACHE_DIR:
+    Path(TEMPLATE_CACHE_DIR).mkdir(parents=True, exist_ok=True)
+templates.env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+
+#Load every template into the environment's cache at startup. Routes ask for
+#"/cards/cards.html" and "cards/cards.html" alike, and Jinja caches them
+#under the name it was given, so both spellings are loaded.
+def precompile_templates() -> int:
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.env.get_template(name)
+        templates.env.get_template("/" + name)
+    return len(names)
+
+#Fill the bytecode cache ahead of time, e.g. while building the image:
+#   TEMPLATE_CACHE_DIR=.template_cache python -m core.templates
+if __name__ == "__main__":
+    start = time.perf_counter()
+    count = precompile_templates()
+    print(f"compiled {count} templates in {(time.perf_counter() - start) * 1000:.1f}ms", file=sys.stderr)
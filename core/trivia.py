@@ -0,0 +1,89 @@
+import time
+from sqlmodel.ext.asyncio.session import AsyncSession
+from core.sampler import random_card
+from core.rounds import ROUND_SECONDS
+from core.answers import AnswerMatcher
+from core import protocol
+from db.models import Card
+
+class TriviaManager:
+
+    #Questions are broadcast to `room`, and drawn only from `set_id` when
+    #one is given. The current round (its number, card and winner) lives in
+    #the room's shared state so every worker checks guesses against the same
+    #card and only one player can win each round.
+    def __init__(self, room, set_id: int | None = None):
+        self.room = room
+        self.set_id = set_id
+        self.question = "What is the capital of France?"
+        self.options = ["Paris", "London", "Berlin", "Madrid"]
+        self.answer = "A"
+        self.guesses = {}
+        self.trivia = {
+            "question": self.question,
+            "options": self.options,
+            "answer": self.answer
+        }
+        self._card_data = None
+        self._card = None
+        self._matcher = None
+
+    @property
+    def round(self) -> dict | None:
+        return self.room.get_state("round")
+
+    #Only rebuild the card and its answer matcher when another question
+    #has been drawn
+    def _load(self):
+        round = self.round
+        data = round["card"] if round else None
+        if data is not self._card_data:
+            self._card_data = data
+            self._card = Card(**data) if data else None
+            self._matcher = AnswerMatcher(data["back"]) if data else None
+
+    @property
+    def current_card(self) -> Card | None:
+        self._load()
+        return self._card
+
+    @property
+    def matcher(self) -> AnswerMatcher | None:
+        self._load()
+        return self._matcher
+        
+    #Draws the next question and returns its text, or None if another worker
+    #drew one first
+    async def get_trivia(self, session:AsyncSession):
+        current = self.round
+        card = await session.run_sync(random_card, self.set_id)
+        if card is None:
+            await self.room.set_state("round", None)
+            return "No cards to ask about yet!"
+        now = time.time()
+        round = {
+            "number": current["number"] + 1 if current else 1,
+            "card": {"id": card.id, "front": card.front, "back": card.back, "set_id": card.set_id},
+            "winner": None,
+            "over": False,
+            "started": now,
+            "ends": now + ROUND_SECONDS,
+        }
+        if not await self.room.compare_and_set("round", current, round):
+            return None
+        return card.front
+    
+    async def accept_guess(self, guess, client_id):
+        #self.guesses[client_id] = answer
+        round = self.round
+        if round is None or round["over"]:
+            return
+        if not self.matcher.matches(guess):
+            return
+        #Several players can get it right at once; the first claim wins
+        if await self.room.compare_and_set("round", round, dict(round, winner=client_id, over=True)):
+            self.room.scoreboard.add(client_id)
+            self.room.rounds.end_round()
+            await self.room.broadcast(protocol.result(round, client_id))
+            #else:
+                #await manager.broadcast(f"Wrong Answer! Client ID: {client_id}. Guess was {guess}. Answer is: {self.current_card.back}. New question coming in 5 seconds...")
@@ -0,0 +1,27 @@
+from sqlalchemy import DDL, event, Table
+
+#Full text index over card fronts and backs. It's an "external content"
+#FTS5 table: it only stores the index and reads the text from the card
+#table, and the triggers keep it in step with every insert, update and
+#delete, whichever route (or bulk import) made the change.
+CARD_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS card_fts USING fts5(
+        front, back, content='card', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS card_fts_insert AFTER INSERT ON card BEGIN
+        INSERT INTO card_fts(rowid, front, back) VALUES (new.id, new.front, new.back);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS card_fts_delete AFTER DELETE ON card BEGIN
+        INSERT INTO card_fts(card_fts, rowid, front, back) VALUES ('delete', old.id, old.front, old.back);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS card_fts_update AFTER UPDATE OF front, back ON card BEGIN
+        INSERT INTO card_fts(card_fts, rowid, front, back) VALUES ('delete', old.id, old.front, old.back);
+        INSERT INTO card_fts(rowid, front, back) VALUES (new.id, new.front, new.back);
+    END""",
+]
+
+#Build the index whenever create_all makes the card table (tests, new databases).
+#Existing databases get it from the alembic migration.
+def install_card_fts(card_table: Table):
+    for statement in CARD_FTS_DDL:
+        event.listen(card_table, "after_create", DDL(statement).execute_if(dialect="sqlite"))
@@ -1,18 +1,62 @@
 from sqlmodel import Field, SQLModel, Relationship
+from sqlalchemy import Index
+from datetime import datetime
+from db.fts import install_card_fts
+from db.versions import install_version_triggers, CARD_VERSION_DDL, SET_VERSION_DDL
 from pydantic import BaseModel
 
 class Set(SQLModel, table=True):
+    #Keyset pagination walks sets in (name, id) order
+    __table_args__ = (Index("ix_set_name_id", "name", "id"),)
     id: int | None = Field(default=None, primary_key=True)
     name: str    
     cards: list["Card"] = Relationship(back_populates="set")
 
 class Card(SQLModel, table=True):
+    #Keyset pagination walks cards in (front, id) order, overall and within a set
+    __table_args__ = (
+        Index("ix_card_front_id", "front", "id"),
+        Index("ix_card_set_id_front_id", "set_id", "front", "id"),
+    )
     id: int | None = Field(default=None, primary_key=True)
     front: str
     back: str
-    set_id: int | None = Field(default=None, foreign_key="set.id")
+    set_id: int | None = Field(default=None, foreign_key="set.id", index=True)
     set: Set | None = Relationship(back_populates="cards")
 
+install_card_fts(Card.__table__)
+install_version_triggers(Card.__table__, CARD_VERSION_DDL)
+install_version_triggers(Set.__table__, SET_VERSION_DDL)
+
+#How many times the cards and sets have changed, kept up to date by the
+#triggers in db/versions.py. Cached pages are tagged with these.
+class ContentVersion(SQLModel, table=True):
+    name: str = Field(primary_key=True)
+    version: int = 0
+    updated: float = 0
+
+#Trivia points per player, written in batches by core.scores.ScoreBoard
+class Score(SQLModel, table=True):
+    id: int | None = Field(default=None, primary_key=True)
+    player: str = Field(unique=True)
+    score: int = 0
+
+#Spaced repetition state for one user and one card, see core.srs
+class Review(SQLModel, table=True):
+    __table_args__ = (
+        #"What's due next for this user" is the first row in this index
+        Index("ix_review_user_due", "user", "due"),
+        #One row per user and card; also finds the newest card a user has seen
+        Index("ix_review_user_card_id", "user", "card_id", unique=True),
+    )
+    id: int | None = Field(default=None, primary_key=True)
+    user: str
+    card_id: int = Field(foreign_key="card.id")
+    ease: float = 2.5
+    interval: float = 0
+    repetitions: int = 0
+    due: datetime
+
 class UserCookie(BaseModel):
     session_id: int | None = 0
     name: str | None = ""
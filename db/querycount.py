@@ -0,0 +1,41 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+
+#Counts the SQL statements an engine runs, so tests can catch a page that
+#suddenly starts running a query per row (the "N+1" problem), e.g.
+#
+#   with query_budget(engine, 2):
+#       client.get("/sets/1")
+class QueryCounter:
+
+    def __init__(self):
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+@contextmanager
+def count_queries(engine):
+    counter = QueryCounter()
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", counter)
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+#Fails with every statement listed if the block runs more than `budget` queries
+@contextmanager
+def query_budget(engine, budget: int):
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count > budget:
+        listing = "\n".join(f"  {statement}" for statement in counter.statements)
+        raise QueryBudgetExceeded(f"Expected at most {budget} queries, ran {counter.count}:\n{listing}")
@@ -0,0 +1,55 @@
+import os
+import re
+from pathlib import Path
+from sqlalchemy.exc import OperationalError
+from db.session import engine, create_db_and_tables
+
+#What to do about the schema when the app starts, from SCHEMA_STARTUP:
+#"create" runs create_all, which makes any missing tables (handy for a fresh
+#checkout or a test database). "check" leaves the schema to Alembic and
+#only makes sure the database has been migrated to the newest revision,
+#which is one small query instead of inspecting every table.
+SCHEMA_STARTUP = os.environ.get("SCHEMA_STARTUP", "create")
+MIGRATIONS = Path(__file__).resolve().parent.parent / "alembic" / "versions"
+
+REVISION = re.compile(r"^revision\b[^=]*=\s*['\"](\w+)['\"]", re.MULTILINE)
+DOWN_REVISION = re.compile(r"^down_revision\b[^=]*=(.*)$", re.MULTILINE)
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+#The newest revision(s) in alembic/versions, read straight from the files so
+#booting doesn't have to import alembic
+def head_revisions(directory: Path = MIGRATIONS) -> set[str]:
+    revisions, parents = set(), set()
+    for path in directory.glob("*.py"):
+        text = path.read_text()
+        revision = REVISION.search(text)
+        if revision is None:
+            continue
+        revisions.add(revision.group(1))
+        down = DOWN_REVISION.search(text)
+        if down is not None:
+            parents.update(re.findall(r"['\"](\w+)['\"]", down.group(1)))
+    return revisions - parents
+
+def current_revisions(engine=engine) -> set[str]:
+    try:
+        with engine.connect() as conn:
+            return {row[0] for row in conn.exec_driver_sql("SELECT version_num FROM alembic_version")}
+    except OperationalError:
+        return set()
+
+def check_schema(engine=engine):
+    current, heads = current_revisions(engine), head_revisions()
+    if current != heads:
+        raise SchemaOutOfDate(
+            f"Database is at {', '.join(sorted(current)) or 'no revision'} but the newest migration is "
+            f"{', '.join(sorted(heads))}. Run `alembic upgrade head` first."
+        )
+
+def prepare_database(mode: str = SCHEMA_STARTUP):
+    if mode == "check":
+        check_schema()
+    else:
+        create_db_and_tables()
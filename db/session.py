@@ -1,13 +1,69 @@
 from sqlmodel import Session, Field, SQLModel, create_engine, select, Relationship
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import event
 from typing import Annotated
 from fastapi import Depends
+import os
 
 #SQL Code Setup
-sqlite_file_name = "database.db"
+sqlite_file_name = os.environ.get("DATABASE_FILE", "database.db")
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+#Engine profiles, picked with the DB_PROFILE environment variable.
+#"production" puts the database in WAL mode so readers and the writer don't
+#block each other, and waits for a lock instead of failing straight away
+#with "database is locked". "default" is plain SQLite.
+SQLITE_PROFILES = {
+    "default": {},
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -64000,       #64MB (negative means KiB)
+        "mmap_size": 268435456,     #256MB
+        "temp_store": "MEMORY",
+    },
+}
+DB_PROFILE = os.environ.get("DB_PROFILE", "production")
+
+#Every uvicorn worker gets its own pool, so split the connection budget
+#between them. WEB_CONCURRENCY is the worker count uvicorn itself reads.
+DB_MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", 40))
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 1))
+DB_POOL_SIZE = max(2, DB_MAX_CONNECTIONS // WEB_CONCURRENCY)
+
+#Run the profile's pragmas on every new connection in the engine's pool
+def use_profile(engine, profile: str = DB_PROFILE):
+    pragmas = SQLITE_PROFILES[profile]
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return engine
+
+def create_sqlite_engine(url: str, profile: str = DB_PROFILE):
+    engine = create_engine(
+        url, connect_args={"check_same_thread": False},
+        pool_size=DB_POOL_SIZE, max_overflow=0, pool_timeout=30,
+    )
+    return use_profile(engine, profile)
+
+def create_async_sqlite_engine(url: str, profile: str = DB_PROFILE):
+    engine = create_async_engine(url, pool_size=DB_POOL_SIZE, max_overflow=0, pool_timeout=30)
+    return use_profile(engine, profile)
+
+engine = create_sqlite_engine(sqlite_url)
+
+#Async engine for `async def` routes and the websocket game, so queries
+#don't block the event loop. Plain `def` routes keep using the sync engine;
+#FastAPI already runs those in a worker thread.
+async_sqlite_url = f"sqlite+aiosqlite:///{sqlite_file_name}"
+async_engine = create_async_sqlite_engine(async_sqlite_url)
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
@@ -16,5 +72,15 @@ def get_session():
     with Session(engine) as session:
         yield session
 
-SessionDep = Annotated[Session, Depends(get_session)]
+#A new async session, for background tasks outside of a request.
+#expire_on_commit=False so we can still read a row after committing it
+#without another (awaited) trip to the database
+def new_async_session() -> AsyncSession:
+    return AsyncSession(async_engine, expire_on_commit=False)
 
+async def get_async_session():
+    async with new_async_session() as session:
+        yield session
+
+SessionDep = Annotated[Session, Depends(get_session)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
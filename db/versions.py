@@ -0,0 +1,40 @@
+from sqlalchemy import DDL, event, Table
+
+#Version counters for cached pages (see core.httpcache). Every change to a
+#card bumps "card" and "set:<its set id>" (both sets when a card moves), and
+#every change to a set bumps "set". Triggers do the bumping so routes, bulk
+#imports and cascaded deletes can't forget to, and every worker sees them.
+NOW = "(julianday('now') - 2440587.5) * 86400.0"
+
+def bump(*names: str) -> str:
+    rows = ", ".join(f"({name}, 1, {NOW})" for name in names)
+    return (f"INSERT INTO contentversion(name, version, updated) VALUES {rows} "
+            "ON CONFLICT(name) DO UPDATE SET version = version + 1, updated = excluded.updated;")
+
+CARD_SET = "'set:' || coalesce({row}.set_id, '')"
+
+CARD_VERSION_DDL = [
+    f"""CREATE TRIGGER IF NOT EXISTS card_version_insert AFTER INSERT ON card BEGIN
+        {bump("'card'", CARD_SET.format(row="new"))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS card_version_update AFTER UPDATE ON card BEGIN
+        {bump("'card'", CARD_SET.format(row="old"))}
+        {bump(CARD_SET.format(row="new"))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS card_version_delete AFTER DELETE ON card BEGIN
+        {bump("'card'", CARD_SET.format(row="old"))}
+    END""",
+]
+
+SET_VERSION_DDL = [
+    f"""CREATE TRIGGER IF NOT EXISTS set_version_{event} AFTER {event.upper()} ON "set" BEGIN
+        {bump("'set'")}
+    END"""
+    for event in ("insert", "update", "delete")
+]
+
+#Like install_card_fts: create_all gets the triggers, existing databases
+#get them from the alembic migration
+def install_version_triggers(table: Table, statements: list[str]):
+    for statement in statements:
+        event.listen(table, "after_create", DDL(statement).execute_if(dialect="sqlite"))
@@ -1,19 +1,23 @@
-from fastapi import FastAPI, Depends, Request, Form, WebSocket, WebSocketDisconnect, Response, Cookie
+from fastapi import FastAPI, Request, Form, WebSocket, WebSocketDisconnect, Response, Cookie, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
-from typing import Annotated
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
 from contextlib import asynccontextmanager
-from sqlmodel import Session, Field, SQLModel, create_engine, select, Relationship
 from fastapi.middleware.cors import CORSMiddleware
-import random
-from db.session import create_db_and_tables, get_session, SessionDep
-from db.models import Card, UserCookie
-from core.templates import templates
-from routers import cards, sets
-import asyncio
-import time
-from typing import Dict
-import json
+from db.session import get_session, SessionDep, AsyncSessionDep, new_async_session, engine, async_engine
+from db.schema import prepare_database
+from db.models import Card
+from core.templates import templates, precompile_templates
+from core.sampler import random_card
+from core.srs import next_card, record_review, GRADES
+from core.rooms import RoomManager, DEFAULT_ROOM
+from core.backplane import create_backplane
+from core.httpcache import page_cache
+from core.catalogue import set_catalogue
+from core.metrics import registry, instrument_engine, MetricsMiddleware, Gauge
+from core.profiler import profiler
+from core.proxy import ProxyHeadersMiddleware
+from core import protocol
+from routers import cards, sets, api
 from pathlib import Path
 
 
@@ -21,9 +25,20 @@ from pathlib import Path
 #Database code missing
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Load the DB
-    create_db_and_tables()
+    # Load the DB (SCHEMA_STARTUP=check to only check Alembic has migrated it)
+    prepare_database()
+    #Compile every template now rather than on the first request for each
+    precompile_templates()
+    await rooms.backplane.start()
+    async with new_async_session() as session:
+        await rooms.scoreboard.load(session)
+    rooms.scoreboard.start(new_async_session)
+    if profiler.threshold:
+        profiler.start()
     yield
+    profiler.stop()
+    await rooms.scoreboard.stop(new_async_session)
+    await rooms.backplane.stop()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -41,104 +56,95 @@ BASE_DIR = Path(__file__).resolve().parent
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
 #app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Add this middleware
-from starlette.middleware.base import BaseHTTPMiddleware
-
-class ProxyHeadersMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        # Trust Railway's proxy headers
-        if "x-forwarded-proto" in request.headers:
-            request.scope["scheme"] = request.headers["x-forwarded-proto"]
-        if "x-forwarded-host" in request.headers:
-            request.scope["server"] = (request.headers["x-forwarded-host"], None)
-        return await call_next(request)
-
+# Trust Railway's proxy headers (FORWARDED_ALLOW_IPS limits which proxies)
 app.add_middleware(ProxyHeadersMiddleware)
 
+#Outermost, so its timings include the other middleware
+instrument_engine(engine)
+instrument_engine(async_engine)
+app.add_middleware(MetricsMiddleware, profiler=profiler)
+
 app.include_router(cards.router)
 app.include_router(sets.router)
+app.include_router(api.router)
 
 @app.get("/", response_class=HTMLResponse)
-async def root(request: Request, session: SessionDep):     
-  cards = session.exec(select(Card)).all()
+async def root(request: Request):
+  #The home page doesn't list any cards, so don't load them
   return templates.TemplateResponse(
-      request=request, name="index.html", context={"cards":cards}
+      request=request, name="index.html", context={}
   )
 
 
+#Hit rates for the rendered page cache and the set name cache
+@app.get("/cache/stats")
+def cache_stats():
+    return {"pages": page_cache.stats(), "sets": set_catalogue.stats()}
+
+cache_stats_gauge = registry.add(Gauge("cache_stats", "Page and set cache counters", ("cache", "stat")))
+
+def collect_cache_stats():
+    for cache, stats in cache_stats().items():
+        for stat, value in stats.items():
+            cache_stats_gauge.set(float(value), cache=cache, stat=stat)
+
+registry.collectors.append(collect_cache_stats)
+
+#Prometheus scrape endpoint
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+#Folded stacks of recent slow requests, when PROFILE_SLOW_REQUESTS is set
+@app.get("/metrics/profiles")
+def slow_profiles(format:str = "json"):
+    if not profiler.running:
+        raise HTTPException(status_code=404, detail="Set PROFILE_SLOW_REQUESTS to profile slow requests")
+    if format == "folded":
+        return PlainTextResponse("\n".join(profile["folded"] for profile in profiler.profiles))
+    return {"profiles": list(profiler.profiles)}
+
+
 @app.get("/learn/")
-def learn(request: Request, session:SessionDep):
-    cards = session.exec(select(Card)).all()
-    card = cards[random.randint(0, (len(cards)-1))]
+def learn(request: Request, session:SessionDep, set_id:int | None = None, user_name=Cookie(default=None)):
+    #Signed in players get spaced repetition, everyone else random cards
+    card = next_card(session, user_name, set_id) if user_name else None
+    caught_up = user_name is not None and card is None
+    if not card:
+        card = random_card(session, set_id)
+    if not card:
+        raise HTTPException(status_code=404, detail="No cards found")
     return templates.TemplateResponse(
-      request=request, name="/learn.html", context={"card":card}
+      request=request, name="/learn.html", context={"card":card, "set_id":set_id, "user_name":user_name, "caught_up":caught_up, "grades":GRADES}
   )
 
+#Record how well the user remembered a card, then go straight to the next one
+@app.post("/learn/{card_id}/review")
+def review_card(session:SessionDep, card_id:int, grade:str = Form(...), set_id:int | None = None, user_name=Cookie(default=None)):
+    if grade not in GRADES:
+        raise HTTPException(status_code=400, detail="Unknown grade")
+    if not user_name:
+        raise HTTPException(status_code=401, detail="Enter your name on the play page to track your progress")
+    if not session.get(Card, card_id):
+        raise HTTPException(status_code=404, detail="Card not found")
+    record_review(session, user_name, card_id, GRADES[grade])
+    url = "/learn/" if set_id is None else f"/learn/?set_id={set_id}"
+    return RedirectResponse(url=url, status_code=303)
+
 ##Websockets
-class ConnectionManager:
-
-    #Here we will 
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-        #self.user_cookies: list[UserCookie] = []
-        #self.user_cookies:Dict[int, UserCookie] = {}
-
-    #Establish a connection, add it to the list
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    #When disconnecting, remove websockt from the list
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    #Send message to a particluar socket
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-
-    #Brodcast Message to all sockets
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
-
-class TriviaManager:
-
-    current_card = None
-
-    def __init__(self):
-        self.question = "What is the capital of France?"
-        self.options = ["Paris", "London", "Berlin", "Madrid"]
-        self.answer = "A"
-        self.guesses = {}
-        self.trivia = {
-            "question": self.question,
-            "options": self.options,
-            "answer": self.answer
-        }
-        
-    def get_trivia(self, session:SessionDep):    
-        cards = session.exec(select(Card)).all()
-        self.current_card = cards[random.randint(0, (len(cards)-1))]
-        return self.current_card.front
-    
-    async def accept_guess(self, guess, client_id):
-        #self.guesses[client_id] = answer
-        if self.current_card is not None:
-            if guess == self.current_card.back:
-                await manager.broadcast(f"Correct Answer! {client_id} correctly guessed the answer: {self.current_card.back}")
-            #else:
-                #await manager.broadcast(f"Wrong Answer! Client ID: {client_id}. Guess was {guess}. Answer is: {self.current_card.back}. New question coming in 5 seconds...")
-       
-manager = ConnectionManager()
-#Todo: create a manager only when there are active connecitons
-triviaManager = TriviaManager()
+#Set BACKPLANE_URL to share rooms between several workers
+rooms = RoomManager(create_backplane())
+
+@app.get("/leaderboard/")
+def leaderboard(limit: int = 10):
+    return {"players": rooms.scoreboard.top(min(limit, 100))}
 
  
 @app.get("/play/")
-def play(response: Response, request: Request, session:SessionDep, user_name=Cookie(default=None)):
+def play(response: Response, request: Request, session:SessionDep, user_name=Cookie(default=None), room_id: str = DEFAULT_ROOM, set_id: int | None = None):
     
     response = templates.TemplateResponse(
-        request=request, name="/play.html", context={"cards":cards, "user_name": user_name}
+        request=request, name="/play.html", context={"cards":cards, "user_name": user_name, "room_id": room_id, "set_id": set_id}
     )
     return response
     '''
@@ -178,11 +184,11 @@ def play(response: Response, request: Request, session:SessionDep, user_name=Coo
 '''
     
 @app.post("/play/")
-def enter_play(response: Response, request: Request, session:SessionDep, user_name: str = Form(...)):
+def enter_play(response: Response, request: Request, session:SessionDep, user_name: str = Form(...), room_id: str = DEFAULT_ROOM, set_id: int | None = None):
 
 
     response = templates.TemplateResponse(
-        request=request, name="/play.html", context={"cards":cards, "user_name":user_name}
+        request=request, name="/play.html", context={"cards":cards, "user_name":user_name, "room_id": room_id, "set_id": set_id}
     )
 
     response.set_cookie(key="user_name", value=user_name, httponly=False)
@@ -197,10 +203,12 @@ def get(request: Request, session:SessionDep):
     return {"msg": "hi"}
 '''
 
+@app.websocket("/ws/{room_id}/{client_id}")
 @app.websocket("/ws/{client_id}")
-async def websocket_endpoint(websocket: WebSocket, client_id: str, session:SessionDep):
+async def websocket_endpoint(websocket: WebSocket, client_id: str, session:AsyncSessionDep, room_id: str = DEFAULT_ROOM, set_id: int | None = None, encoding: str | None = None):
     
-    await manager.connect(websocket)
+    room = await rooms.join(room_id, websocket, set_id, client_id, protocol.choose_encoding(encoding))
+    manager = room.manager
 
     try:
         while True:
@@ -212,19 +220,19 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, session:Sessi
                 try:
                     action = data['payload']['action']
                     if action == "nextQuestion":
-                        await manager.broadcast("Triva Question!")
-                        await manager.broadcast(triviaManager.get_trivia(session))
+                        #The round scheduler asks the question
+                        if not room.rounds.request_next():
+                            await manager.send_personal_message("Slow down! Give everyone a chance to answer first.", websocket)
                 except KeyError:
                     await manager.send_personal_message("Error: Unkown Key", websocket)
            
             elif message_type == "chat":                
                 #await manager.send_personal_message(f"You wrote: {data}", websocket)
-                await manager.broadcast(f"{client_id} says: {data['payload']['message']}")
-                await triviaManager.accept_guess(data['payload']['message'], client_id)
+                await room.broadcast(protocol.chat(client_id, data['payload']['message']))
+                await room.trivia.accept_guess(data['payload']['message'], client_id)
 
     except WebSocketDisconnect:
-            manager.disconnect(websocket)            
-            await manager.broadcast(f"Client #{client_id} left the chat")
+            await rooms.leave(room, websocket, client_id)
             
     '''
     try:
@@ -0,0 +1,166 @@
+from typing import Annotated
+from fastapi import APIRouter, Request, Query, HTTPException, Response
+from pydantic import BaseModel
+from sqlmodel import select
+from db.session import SessionDep
+from db.models import Card, Set
+from core.pagination import keyset_page, MAX_PAGE_SIZE
+from core.catalogue import set_catalogue
+from core.responses import json_response
+
+#JSON version of routers/cards.py and routers/sets.py for the mobile app and
+#scripts. Rows are read as plain columns (no ORM objects) and written out
+#with orjson. Every read takes fields=front,back to only fetch and send
+#those columns.
+router = APIRouter(prefix="/api/v1")
+
+CARD_FIELDS = {"id": Card.id, "front": Card.front, "back": Card.back, "set_id": Card.set_id}
+SET_FIELDS = {"id": Set.id, "name": Set.name}
+
+class CardIn(BaseModel):
+    front: str
+    back: str
+    set_id: int | None = None
+
+class CardPatch(BaseModel):
+    front: str | None = None
+    back: str | None = None
+    set_id: int | None = None
+
+class SetIn(BaseModel):
+    name: str
+
+#Returns the names to send back and the columns to select for them. `extra`
+#columns (the pagination sort key) are selected but not sent.
+def pick_fields(fields: str | None, available: dict, extra: tuple = ()) -> tuple[list[str], list]:
+    names = [name.strip() for name in fields.split(",") if name.strip()] if fields else list(available)
+    unknown = [name for name in names if name not in available]
+    if unknown or not names:
+        raise HTTPException(status_code=400, detail=f"fields must be some of {', '.join(available)}")
+    columns = [available[name] for name in names]
+    columns += [column for column in extra if column.key not in names]
+    return names, columns
+
+def as_dicts(rows, names: list[str]) -> list[dict]:
+    return [{name: getattr(row, name) for name in names} for row in rows]
+
+def check_batch(ids: list[int]):
+    if len(ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PAGE_SIZE} ids at a time")
+
+#Rows for the ids that exist, in the order they were asked for
+def get_batch(session, model, available: dict, ids: list[int], fields: str | None) -> dict:
+    check_batch(ids)
+    names, columns = pick_fields(fields, available, (model.id,))
+    rows = {row.id: row for row in session.exec(select(*columns).where(model.id.in_(ids))).all()}
+    return {
+        "items": as_dicts([rows[id] for id in ids if id in rows], names),
+        "missing": [id for id in ids if id not in rows],
+    }
+
+def get_one(session, model, available: dict, id: int, fields: str | None, detail: str) -> dict:
+    names, columns = pick_fields(fields, available)
+    row = session.exec(select(*columns).where(model.id == id)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail=detail)
+    return as_dicts([row], names)[0]
+
+def check_set(session, set_id: int | None):
+    if set_id is not None and not session.get(Set, set_id):
+        raise HTTPException(status_code=400, detail="Set not found")
+
+##Cards
+@router.get("/cards")
+def list_cards(request: Request, session:SessionDep, fields:str | None = None, set_id:int | None = None,
+               after:str | None = None, before:str | None = None, limit:int | None = None):
+    sort = (Card.front, Card.id)
+    names, columns = pick_fields(fields, CARD_FIELDS, sort)
+    query = select(*columns)
+    if set_id is not None:
+        query = query.where(Card.set_id == set_id)
+    page = keyset_page(session, query, sort, after, before, limit)
+    return json_response(request, {"items":as_dicts(page.items, names), "next":page.next, "prev":page.prev})
+
+@router.get("/cards/batch")
+def batch_cards(request: Request, session:SessionDep, ids: Annotated[list[int], Query()], fields:str | None = None):
+    return json_response(request, get_batch(session, Card, CARD_FIELDS, ids, fields))
+
+@router.get("/cards/{id}")
+def get_card(request: Request, session:SessionDep, id:int, fields:str | None = None):
+    return json_response(request, get_one(session, Card, CARD_FIELDS, id, fields, "Card not found"))
+
+@router.post("/cards")
+def create_card(request: Request, session:SessionDep, card: CardIn):
+    check_set(session, card.set_id)
+    db_card = Card.model_validate(card.model_dump())
+    session.add(db_card)
+    session.commit()
+    session.refresh(db_card)
+    return json_response(request, db_card.model_dump(), status_code=201)
+
+@router.patch("/cards/{id}")
+def update_card(request: Request, session:SessionDep, id:int, card: CardPatch):
+    db_card = session.get(Card, id)
+    if not db_card:
+        raise HTTPException(status_code=404, detail="Card not found")
+    changes = card.model_dump(exclude_unset=True)
+    check_set(session, changes.get("set_id"))
+    db_card.sqlmodel_update(changes)
+    session.add(db_card)
+    session.commit()
+    session.refresh(db_card)
+    return json_response(request, db_card.model_dump())
+
+@router.delete("/cards/{id}", status_code=204)
+def delete_card(session:SessionDep, id:int):
+    db_card = session.get(Card, id)
+    if not db_card:
+        raise HTTPException(status_code=404, detail="Card not found")
+    session.delete(db_card)
+    session.commit()
+    return Response(status_code=204)
+
+##Sets
+@router.get("/sets")
+def list_sets(request: Request, session:SessionDep, fields:str | None = None,
+              after:str | None = None, before:str | None = None, limit:int | None = None):
+    sort = (Set.name, Set.id)
+    names, columns = pick_fields(fields, SET_FIELDS, sort)
+    page = keyset_page(session, select(*columns), sort, after, before, limit)
+    return json_response(request, {"items":as_dicts(page.items, names), "next":page.next, "prev":page.prev})
+
+@router.get("/sets/batch")
+def batch_sets(request: Request, session:SessionDep, ids: Annotated[list[int], Query()], fields:str | None = None):
+    return json_response(request, get_batch(session, Set, SET_FIELDS, ids, fields))
+
+@router.get("/sets/{id}")
+def get_set(request: Request, session:SessionDep, id:int, fields:str | None = None):
+    return json_response(request, get_one(session, Set, SET_FIELDS, id, fields, "Set not found"))
+
+@router.get("/sets/{id}/cards")
+def get_set_cards(request: Request, session:SessionDep, id:int, fields:str | None = None,
+                  after:str | None = None, before:str | None = None, limit:int | None = None):
+    if not session.get(Set, id):
+        raise HTTPException(status_code=404, detail="Set not found")
+    return list_cards(request, session, fields, id, after, before, limit)
+
+@router.post("/sets")
+def create_set(request: Request, session:SessionDep, set: SetIn):
+    db_set = Set.model_validate(set.model_dump())
+    session.add(db_set)
+    session.commit()
+    session.refresh(db_set)
+    set_catalogue.invalidate()
+    return json_response(request, db_set.model_dump(), status_code=201)
+
+@router.patch("/sets/{id}")
+def update_set(request: Request, session:SessionDep, id:int, set: SetIn):
+    db_set = session.get(Set, id)
+    if not db_set:
+        raise HTTPException(status_code=404, detail="Set not found")
+    db_set.sqlmodel_update(set.model_dump())
+    session.add(db_set)
+    session.commit()
+    session.refresh(db_set)
+    set_catalogue.invalidate()
+    return json_response(request, db_set.model_dump())
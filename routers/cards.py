@@ -1,54 +1,101 @@
-from fastapi import APIRouter, Depends, Request, Form, HTTPException
+from fastapi import APIRouter, Depends, Request, Form, HTTPException, UploadFile, File
 from sqlmodel import select
-from db.session import get_session, SessionDep
+from sqlalchemy.orm import joinedload
+from db.session import get_session, SessionDep, AsyncSessionDep
 from db.models import Card, Set
 from core.templates import templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from core.pagination import keyset_page
+from core.catalogue import set_catalogue
+from core.httpcache import cached_page
+from core.search import search_cards, DEFAULT_RESULTS
+from core.bulk import FORMATS, DEFAULT_BATCH_SIZE, format_for, read_rows, import_cards, export_cards
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 
 router = APIRouter(prefix="/cards")
 
 @router.get("/")
-def get_cards(request: Request, session:SessionDep):
-    cards = session.exec(select(Card).order_by(Card.front)).all()
+def get_cards(request: Request, session:SessionDep, after:str | None = None, before:str | None = None, limit:int | None = None):
+    def render():
+        #Each tile shows its set's name, so join the sets in rather than
+        #loading them one card at a time
+        page = keyset_page(session, select(Card).options(joinedload(Card.set)), (Card.front, Card.id), after, before, limit)
+        return templates.TemplateResponse(
+          request=request, name="/cards/cards.html", context={"cards":page.items, "page":page}
+      )
+    return cached_page(request, session, ("card", "set"), render)
+
+#JSON version of the card list, same cursors as the html page
+@router.get("/page")
+def get_cards_page(session:SessionDep, after:str | None = None, before:str | None = None, limit:int | None = None):
+    page = keyset_page(session, select(Card), (Card.front, Card.id), after, before, limit)
+    return {"items":page.items, "next":page.next, "prev":page.prev}
+
+@router.get("/search")
+def search(request: Request, session:SessionDep, q:str = "", set_id:int | None = None, limit:int = DEFAULT_RESULTS, format:str = "html"):
+    cards = search_cards(session, q, set_id, limit)
+    if format == "json":
+        return {"items":cards}
     return templates.TemplateResponse(
-      request=request, name="/cards/cards.html", context={"cards":cards}
+      request=request, name="/cards/search.html", context={"cards":cards, "q":q, "set_id":set_id}
   )
 
+#Bulk upload of a csv, jsonl or Anki (tab separated) file. Sets are looked
+#up by name and created if they don't exist yet.
+@router.post("/import")
+def import_file(session:SessionDep, file: UploadFile = File(...), format:str | None = Form(None), batch_size:int = Form(DEFAULT_BATCH_SIZE)):
+    format = format or format_for(file.filename)
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of {', '.join(FORMATS)}")
+    result = import_cards(session, read_rows(file.file, format), batch_size)
+    if result.sets_created:
+        set_catalogue.invalidate()
+    return result
+
+@router.get("/export")
+def export_file(session:SessionDep, format:str = "csv", set_id:int | None = None):
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of {', '.join(FORMATS)}")
+    media_type = "application/x-ndjson" if format == "jsonl" else "text/csv" if format == "csv" else "text/tab-separated-values"
+    return StreamingResponse(
+        export_cards(session, format, set_id), media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="cards.{"txt" if format == "tsv" else format}"'},
+    )
+
 @router.get("/add")
 def edit_cards(request: Request, session:SessionDep, set_id:int = 0):
-    cards = session.exec(select(Card)).all()
-    sets = session.exec(select(Set)).all()
+    sets = set_catalogue.get(session)
     return templates.TemplateResponse(
-      request=request, name="/cards/add.html", context={"cards":cards, "sets":sets, "set_id":set_id}
+      request=request, name="/cards/add.html", context={"sets":sets, "set_id":set_id}
   )
     
 @router.post("/add")
-async def create_card(session: SessionDep, front: str = Form(...), back: str = Form(...), set_id: int = Form(...)):
+async def create_card(session: AsyncSessionDep, front: str = Form(...), back: str = Form(...), set_id: int = Form(...)):
 #def create_card(card: Card, session: SessionDep):
     #db_card = Card.model_validate(card)
     db_card = Card(front=front, back=back, set_id=set_id)    
     session.add(db_card)
-    session.commit()
-    session.refresh(db_card)
+    await session.commit()
     return RedirectResponse(url=f"/cards/{db_card.id}", status_code=302)
 
 @router.get("/{id}")
 def get_card(request: Request, session:SessionDep, id:int,action:str="view"):
-    
-    card = session.exec(select(Card).where(Card.id == id)).first()
-    sets = session.exec(select(Set)).all()
-    
-    if not card:
-        raise HTTPException(status_code=404, detail="Card not found")
-    #return card
-    return templates.TemplateResponse(
-      request=request, name="/cards/card.html", context={"card":card, "action":action, "sets":sets}
-  )
+    def render():
+        card = session.get(Card, id, options=[joinedload(Card.set)])
+        
+        if not card:
+            raise HTTPException(status_code=404, detail="Card not found")
+        #Only the edit form needs the set dropdown
+        sets = set_catalogue.get(session) if action == "edit" else {}
+        #return card
+        return templates.TemplateResponse(
+          request=request, name="/cards/card.html", context={"card":card, "action":action, "sets":sets}
+      )
+    return cached_page(request, session, ("card", "set"), render)
 
 @router.get("/{card_id}/edit")
 def edit_card(request: Request, session:SessionDep, card_id:int):
-    card = session.exec(select(Card).where(Card.id==card_id)).first()
-    sets = session.exec(select(Set)).all()
+    card = session.get(Card, card_id)
+    sets = set_catalogue.get(session)
     return templates.TemplateResponse(
       request=request, name="/cards/add.html", context={"card":card, "sets":sets}
   )
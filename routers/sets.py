@@ -1,47 +1,68 @@
 from fastapi import APIRouter, Depends, Request, Form, HTTPException
 from sqlmodel import select
-from db.session import get_session, SessionDep
+from sqlalchemy.orm import raiseload
+from db.session import get_session, SessionDep, AsyncSessionDep
 from db.models import Card, Set
 from core.templates import templates
+from core.pagination import keyset_page
+from core.catalogue import set_catalogue
+from core.httpcache import cached_page
 from fastapi.responses import HTMLResponse, RedirectResponse
 
 router = APIRouter(prefix="/sets")
 
 @router.get("/")
-def get_sets(request: Request, session:SessionDep):
-    sets = session.exec(select(Set).order_by(Set.name)).all()
-    return templates.TemplateResponse(
-      request=request, name="/sets/sets.html", context={"sets":sets}
-  )
+def get_sets(request: Request, session:SessionDep, after:str | None = None, before:str | None = None, limit:int | None = None):
+    def render():
+        page = keyset_page(session, select(Set), (Set.name, Set.id), after, before, limit)
+        return templates.TemplateResponse(
+          request=request, name="/sets/sets.html", context={"sets":page.items, "page":page}
+      )
+    return cached_page(request, session, ("set",), render)
+
+#JSON version of the set list, same cursors as the html page
+@router.get("/page")
+def get_sets_page(session:SessionDep, after:str | None = None, before:str | None = None, limit:int | None = None):
+    page = keyset_page(session, select(Set), (Set.name, Set.id), after, before, limit)
+    return {"items":page.items, "next":page.next, "prev":page.prev}
 
 @router.get("/{id}")
-def get_set(request: Request, session:SessionDep, id:int,action:str="view"):
-    
-    set = session.exec(select(Set).where(Set.id == id)).first()
-    #cards = session.exec(select(Card).where(Card.set_id==id)).all()
-    if set is not None:
-        cards = set.cards
-    
-    if not set:
+def get_set(request: Request, session:SessionDep, id:int,action:str="view", after:str | None = None, before:str | None = None, limit:int | None = None):
+    def render():
+        #set.cards would load every card in the set, so refuse to lazy load it here
+        set = session.exec(select(Set).where(Set.id == id).options(raiseload(Set.cards))).first()
+        
+        if not set:
+            raise HTTPException(status_code=404, detail="Set not found")
+
+        #Only load one page of the set's cards rather than set.cards. Their
+        #card.set is the set above, already in the session, so it costs no query.
+        page = keyset_page(session, select(Card).where(Card.set_id == id), (Card.front, Card.id), after, before, limit)
+        
+        return templates.TemplateResponse(
+          request=request, name="/sets/set.html", context={"set":set, "action":action, "cards":page.items, "page":page}
+      )
+    return cached_page(request, session, ("set", f"set:{id}"), render)
+
+@router.get("/{id}/cards")
+def get_set_cards(session:SessionDep, id:int, after:str | None = None, before:str | None = None, limit:int | None = None):
+    if not session.get(Set, id):
         raise HTTPException(status_code=404, detail="Set not found")
-    
-    return templates.TemplateResponse(
-      request=request, name="/sets/set.html", context={"set":set, "action":action, "cards":cards}
-  )
+    page = keyset_page(session, select(Card).where(Card.set_id == id), (Card.front, Card.id), after, before, limit)
+    return {"items":page.items, "next":page.next, "prev":page.prev}
 
 @router.get("/add/")
-def add_sets(request: Request, session:SessionDep):
-    sets = session.exec(select(Set)).all()
+def add_sets(request: Request):
     return templates.TemplateResponse(
-      request=request, name="/sets/add.html", context={"sets":sets}
+      request=request, name="/sets/add.html", context={}
   )
     
 @router.post("/add")
-async def create_set(session: SessionDep, name: str = Form(...)):
+async def create_set(session: AsyncSessionDep, name: str = Form(...)):
     db_set = Set(name=name)
     session.add(db_set)
-    session.commit()
-    session.refresh(db_set)
+    await session.commit()
+    set_catalogue.invalidate()
     return RedirectResponse(url=f"/sets/{db_set.id}", status_code=303)
 
 #Update Cards
@@ -56,5 +77,6 @@ def update_set(set_id: int, session: SessionDep, name: str = Form(...)):
     session.add(db_set)
     session.commit()
     session.refresh(db_set)
+    set_catalogue.invalidate()
     #return db_card
     return RedirectResponse(url=f"/sets/{db_set.id}", status_code=303)
\ No newline at end of file
@@ -1,7 +1,11 @@
 from fastapi.testclient import TestClient
 from sqlmodel import Session, Field, SQLModel, create_engine, select, Relationship
 import re
+import json
 from main import app, get_session
+from db.session import get_async_session, new_async_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
 from bs4 import BeautifulSoup
 
 #client = TestClient(app)
@@ -46,6 +50,13 @@ def test_create_set():
             return session  
         app.dependency_overrides[get_session] = get_session_override  
 
+    #create_set uses the async session
+    async_engine = create_async_engine("sqlite+aiosqlite:///test.db")
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+    app.dependency_overrides[get_async_session] = get_async_session_override
+
     client = TestClient(app)
     
     #Post our set data and save the response
@@ -88,4 +99,848 @@ def test_create_set():
     assert "text/html" in response.headers["content-type"]
     html = response.text
     assert "Science" in html    
-    app.dependency_overrides.clear()
\ No newline at end of file
+    app.dependency_overrides.clear()
+
+def test_random_card():
+    from db.models import Card, Set
+    from core.sampler import random_card
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        #No cards yet
+        assert random_card(session) is None
+
+        science = Set(name="Science")
+        history = Set(name="History")
+        session.add(science)
+        session.add(history)
+        session.commit()
+        for i in range(20):
+            session.add(Card(front=f"Q{i}", back=f"A{i}", set_id=science.id if i % 2 else history.id))
+        session.commit()
+
+        assert random_card(session) is not None
+        #Scoped to a set we only ever get cards from that set
+        for _ in range(20):
+            assert random_card(session, science.id).set_id == science.id
+        assert random_card(session, 999) is None
+
+
+def test_paginate_cards():
+    from sqlmodel.pool import StaticPool
+    from db.models import Card
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        for i in range(25):
+            session.add(Card(front=f"Question {i:02}", back=f"Answer {i}"))
+        session.commit()
+
+        def get_session_override():
+            return session
+        app.dependency_overrides[get_session] = get_session_override
+
+        client = TestClient(app)
+
+        #Walk forward through every page of the json api
+        fronts = []
+        response = client.get("/cards/page?limit=10")
+        pages = [response.json()]
+        while pages[-1]["next"]:
+            pages.append(client.get("/cards/page?limit=10&after=" + pages[-1]["next"]).json())
+        for page in pages:
+            fronts += [card["front"] for card in page["items"]]
+        assert len(pages) == 3
+        assert fronts == [f"Question {i:02}" for i in range(25)]
+
+        #And back again from the last page
+        response = client.get("/cards/page?limit=10&before=" + pages[-1]["prev"])
+        assert response.json()["items"] == pages[1]["items"]
+
+        #The html page links to the next page
+        response = client.get("/cards/?limit=10")
+        assert response.status_code == 200
+        assert "after=" + pages[0]["next"] in response.text
+
+        assert client.get("/cards/page?after=not-a-cursor").status_code == 400
+    app.dependency_overrides.clear()
+
+
+def test_set_catalogue():
+    from db.models import Set
+    from core.catalogue import SetCatalogue
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    catalogue = SetCatalogue()
+
+    with Session(engine) as session:
+        session.add(Set(name="Science"))
+        session.commit()
+
+        assert list(catalogue.get(session).values()) == ["Science"]
+        assert list(catalogue.get(session).values()) == ["Science"]
+        assert (catalogue.hits, catalogue.misses) == (1, 1)
+
+        #New sets only show up once the cache is invalidated
+        session.add(Set(name="History"))
+        session.commit()
+        assert list(catalogue.get(session).values()) == ["Science"]
+        catalogue.invalidate()
+        assert list(catalogue.get(session).values()) == ["History", "Science"]
+        assert (catalogue.hits, catalogue.misses) == (2, 2)
+
+
+def test_trivia_question(tmp_path):
+    from db.models import Card
+    from main import rooms
+    db_file = tmp_path / "trivia.db"
+    engine = create_engine(f"sqlite:///{db_file}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Card(front="Capital of France?", back="Paris"))
+        session.commit()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_file}")
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+    app.dependency_overrides[get_async_session] = get_async_session_override
+    #The round scheduler opens its own sessions
+    rooms.session_factory = lambda: AsyncSession(async_engine, expire_on_commit=False)
+
+    client = TestClient(app)
+    with client.websocket_connect("/ws/alice?encoding=text") as websocket:
+        websocket.send_json({"type": "trivia", "payload": {"action": "nextQuestion"}})
+        assert websocket.receive_text() == "Triva Question!"
+        assert websocket.receive_text() == "Capital of France?"
+        websocket.send_json({"type": "chat", "payload": {"message": "Paris"}})
+        assert websocket.receive_text() == "alice says: Paris"
+        assert "alice correctly guessed" in websocket.receive_text()
+    app.dependency_overrides.clear()
+    rooms.session_factory = new_async_session
+
+
+def test_broadcast_evicts_slow_clients():
+    import asyncio
+    from core.connections import ConnectionManager
+
+    class FakeWebSocket:
+        def __init__(self, delay=0):
+            self.delay = delay
+            self.received = []
+            self.closed = False
+        async def accept(self):
+            pass
+        async def send(self, message):
+            await asyncio.sleep(self.delay)
+            self.received.append(message["text"])
+        async def close(self, code=1000, reason=None):
+            self.closed = True
+
+    async def run():
+        manager = ConnectionManager(max_queue=5, coalesce=0)
+        fast = FakeWebSocket()
+        stuck = FakeWebSocket(delay=60)
+        await manager.connect(fast, "text")
+        await manager.connect(stuck, "text")
+        for i in range(10):
+            await manager.broadcast(f"message {i}")
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        return manager, fast, stuck
+
+    manager, fast, stuck = asyncio.run(run())
+    assert fast.received == [f"message {i}" for i in range(10)]
+    assert stuck.closed
+    assert list(manager.active_connections) == [fast]
+    assert manager.evicted == 1
+
+
+def test_rooms(tmp_path):
+    from db.models import Card, Set
+    from main import rooms
+    db_file = tmp_path / "rooms.db"
+    engine = create_engine(f"sqlite:///{db_file}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Set(id=1, name="Geography"))
+        session.add(Set(id=2, name="Science"))
+        session.add(Card(front="Capital of France?", back="Paris", set_id=1))
+        session.add(Card(front="H2O is?", back="Water", set_id=2))
+        session.commit()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_file}")
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+    app.dependency_overrides[get_async_session] = get_async_session_override
+    rooms.session_factory = lambda: AsyncSession(async_engine, expire_on_commit=False)
+
+    client = TestClient(app)
+    with client.websocket_connect("/ws/geo/alice?set_id=1&encoding=text") as alice:
+        with client.websocket_connect("/ws/sci/bob?set_id=2&encoding=text") as bob:
+            assert set(rooms.rooms) == {"geo", "sci"}
+
+            #Questions come from the room's set, and stay in the room
+            bob.send_json({"type": "trivia", "payload": {"action": "nextQuestion"}})
+            assert bob.receive_text() == "Triva Question!"
+            assert bob.receive_text() == "H2O is?"
+            alice.send_json({"type": "chat", "payload": {"message": "hello"}})
+            assert alice.receive_text() == "alice says: hello"
+        #Bob was the only player in his room
+        assert set(rooms.rooms) == {"geo"}
+        alice.send_json({"type": "trivia", "payload": {"action": "nextQuestion"}})
+        assert alice.receive_text() == "Triva Question!"
+        assert alice.receive_text() == "Capital of France?"
+    assert rooms.rooms == {}
+    app.dependency_overrides.clear()
+    rooms.session_factory = new_async_session
+
+
+def test_backplane_across_workers(tmp_path):
+    import asyncio
+    import os
+    import socket
+    import subprocess
+    import sys
+    import time
+    import websockets
+    from core.backplane import SocketBackplane
+
+    def free_port():
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
+
+    def wait_for_port(port):
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise TimeoutError(port)
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    broker_url = f"tcp://127.0.0.1:{free_port()}"
+    db_file = tmp_path / "workers.db"
+    #Create the tables up front so the workers don't race to do it
+    SQLModel.metadata.create_all(create_engine(f"sqlite:///{db_file}"))
+    env = dict(os.environ, BACKPLANE_URL=broker_url, DATABASE_FILE=str(db_file))
+    processes = [subprocess.Popen([sys.executable, "-m", "core.backplane", broker_url], cwd=root, env=env)]
+    try:
+        wait_for_port(int(broker_url.rsplit(":", 1)[1]))
+        ports = [free_port() for _ in range(3)]
+        for port in ports:
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                cwd=root, env=env,
+            ))
+        for port in ports:
+            wait_for_port(port)
+
+        async def play():
+            #One player on each worker, all in the same room
+            players = [await websockets.connect(f"ws://127.0.0.1:{port}/ws/shared/p{i}?encoding=text") for i, port in enumerate(ports)]
+            latencies = []
+            for n in range(20):
+                start = time.perf_counter()
+                await players[0].send(json.dumps({"type": "chat", "payload": {"message": f"hi {n}"}}))
+                for player in players:
+                    assert await asyncio.wait_for(player.recv(), 5) == f"p0 says: hi {n}"
+                latencies.append(time.perf_counter() - start)
+            for player in players:
+                await player.close()
+
+            #Room state written on one worker can be read on another
+            first, second = SocketBackplane(broker_url), SocketBackplane(broker_url)
+            for backplane in (first, second):
+                backplane.deliver = lambda room_id, message: asyncio.sleep(0)
+                await backplane.start()
+            await first.set_state("shared", "card", {"front": "Q", "back": "A"})
+            for _ in range(50):
+                if second.get_state("shared", "card"):
+                    break
+                await asyncio.sleep(0.01)
+            assert second.get_state("shared", "card") == {"front": "Q", "back": "A"}
+            await first.stop()
+            await second.stop()
+            return latencies
+
+        latencies = sorted(asyncio.run(play()))
+        print(f"cross-worker broadcast p50 {latencies[len(latencies) // 2] * 1000:.2f}ms")
+        assert latencies[len(latencies) // 2] < 0.5
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+def test_answer_matching():
+    import asyncio
+    from core.answers import AnswerMatcher
+    from core.rooms import Room, RoomManager
+
+    matcher = AnswerMatcher("Paris | City of Light")
+    for guess in ["Paris", "paris!", "  PARIS ", "the paris", "Pariss", "city of light"]:
+        assert matcher.matches(guess), guess
+    for guess in ["London", "P", "", "city"]:
+        assert not matcher.matches(guess), guess
+    #No typos allowed in numbers
+    assert not AnswerMatcher("1945").matches("1946")
+
+    async def run():
+        rooms = RoomManager()
+        sent = []
+        async def deliver(room_id, message):
+            sent.append(message)
+        rooms.backplane.deliver = deliver
+
+        room = Room("test", rooms)
+        await room.set_state("round", {"number": 1, "card": {"id": 1, "front": "Capital of France?", "back": "Paris", "set_id": None}, "winner": None, "over": False, "started": 0, "ends": 0})
+        #Both right, but only the first one wins the round
+        await asyncio.gather(room.trivia.accept_guess("paris", "alice"), room.trivia.accept_guess("Paris", "bob"))
+        return room, sent
+
+    room, sent = asyncio.run(run())
+    assert sent == [{"t": "result", "round": 1, "winner": "alice", "answer": "Paris"}]
+    assert room.get_state("round")["winner"] == "alice"
+
+
+def test_rounds_and_scores(tmp_path, monkeypatch):
+    import asyncio
+    import core.trivia
+    import core.rounds
+    from db.models import Card, Score
+    from core.scores import ScoreBoard
+    from main import rooms
+    db_file = tmp_path / "rounds.db"
+    engine = create_engine(f"sqlite:///{db_file}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Card(front="Capital of France?", back="Paris"))
+        session.commit()
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_file}")
+    rooms.session_factory = lambda: AsyncSession(async_engine, expire_on_commit=False)
+    monkeypatch.setattr(core.trivia, "ROUND_SECONDS", 0.2)
+    monkeypatch.setattr(core.rounds, "BREAK_SECONDS", 60)
+
+    points = rooms.scoreboard.scores.get("alice", 0)
+    client = TestClient(app)
+    with client.websocket_connect("/ws/timed/alice?encoding=text") as alice:
+        alice.send_json({"type": "trivia", "payload": {"action": "nextQuestion"}})
+        assert alice.receive_text() == "Triva Question!"
+        assert alice.receive_text() == "Capital of France?"
+        #Asking again straight away is refused
+        alice.send_json({"type": "trivia", "payload": {"action": "nextQuestion"}})
+        assert alice.receive_text().startswith("Slow down!")
+        #Nobody answers, so the round times out
+        assert alice.receive_text() == "Time's up! The answer was: Paris"
+        #Answers after that don't count
+        alice.send_json({"type": "chat", "payload": {"message": "Paris"}})
+        assert alice.receive_text() == "alice says: Paris"
+    rooms.session_factory = new_async_session
+    assert rooms.scoreboard.scores.get("alice", 0) == points
+
+    #Points are saved in one batch and added to what's already there
+    async def save():
+        scoreboard = ScoreBoard()
+        scoreboard.add("alice")
+        scoreboard.add("bob", 3)
+        async with AsyncSession(async_engine) as session:
+            await scoreboard.flush(session)
+            scoreboard.add("alice")
+            await scoreboard.flush(session)
+            fresh = ScoreBoard()
+            await fresh.load(session)
+        return scoreboard, fresh
+    scoreboard, fresh = asyncio.run(save())
+    assert scoreboard.pending == {}
+    assert fresh.top() == [{"player": "bob", "score": 3}, {"player": "alice", "score": 2}]
+    with Session(engine) as session:
+        assert len(session.exec(select(Score)).all()) == 2
+
+    assert client.get("/leaderboard/").status_code == 200
+
+
+def test_spaced_repetition():
+    from datetime import timedelta
+    from db.models import Card
+    from core.srs import next_card, record_review, utcnow, GRADES
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    now = utcnow()
+
+    with Session(engine) as session:
+        cards = [Card(front=f"Q{i}", back=f"A{i}") for i in range(3)]
+        session.add_all(cards)
+        session.commit()
+
+        #New cards come in order
+        assert next_card(session, "alice", now=now).id == cards[0].id
+        review = record_review(session, "alice", cards[0].id, GRADES["good"], now=now)
+        assert review.interval == 1
+        assert next_card(session, "alice", now=now).id == cards[1].id
+        #Forgotten cards come back in a few minutes, ahead of new ones
+        record_review(session, "alice", cards[1].id, GRADES["again"], now=now)
+        later = now + timedelta(minutes=15)
+        assert next_card(session, "alice", now=later).id == cards[1].id
+        #Other users have their own progress
+        assert next_card(session, "bob", now=now).id == cards[0].id
+
+        #Intervals grow each time a card is remembered
+        for expected in (6, 15):
+            now += timedelta(days=30)
+            assert record_review(session, "alice", cards[0].id, GRADES["good"], now=now).interval == expected
+
+    client = TestClient(app, cookies={"user_name": "alice"})
+    assert client.post("/learn/1/review", data={"grade": "nope"}).status_code == 400
+
+
+def test_import_export():
+    from sqlmodel.pool import StaticPool
+    from db.models import Card, Set
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        session.add(Set(name="Geography"))
+        session.commit()
+
+        def get_session_override():
+            return session
+        app.dependency_overrides[get_session] = get_session_override
+        client = TestClient(app)
+
+        upload = 'front,back,set\nCapital of France?,Paris,Geography\n"Multi\nline",Yes,Science\n,No front,\nH2O?,Water,\n'
+        response = client.post("/cards/import", files={"file": ("deck.csv", upload)}, data={"batch_size": 2})
+        result = response.json()
+        assert (result["imported"], result["skipped"], result["sets_created"]) == (3, 1, 1)
+        assert result["errors"] == ["Line 5: front is missing"]
+
+        upload = '{"front": "2+2?", "back": "4", "set": "Science"}\nnot json\n'
+        result = client.post("/cards/import", files={"file": ("deck.jsonl", upload)}).json()
+        assert (result["imported"], result["skipped"], result["sets_created"]) == (1, 1, 0)
+
+        response = client.get("/cards/export?format=jsonl")
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert rows == [
+            {"front": "Capital of France?", "back": "Paris", "set": "Geography"},
+            {"front": "Multi\nline", "back": "Yes", "set": "Science"},
+            {"front": "H2O?", "back": "Water", "set": None},
+            {"front": "2+2?", "back": "4", "set": "Science"},
+        ]
+        #What we export can be imported again
+        response = client.get("/cards/export?format=tsv")
+        result = client.post("/cards/import", files={"file": ("deck.txt", response.content)}).json()
+        assert result["imported"] == 4
+        assert len(session.exec(select(Card)).all()) == 8
+    app.dependency_overrides.clear()
+
+
+def test_search_cards():
+    from sqlmodel.pool import StaticPool
+    from db.models import Card
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        session.add(Card(front="What does photosynthesis make?", back="Glucose", set_id=1))
+        session.add(Card(front="Capital of France?", back="Paris", set_id=2))
+        session.add(Card(front="Photo of the Eiffel Tower is in?", back="Paris", set_id=2))
+        session.commit()
+
+        def get_session_override():
+            return session
+        app.dependency_overrides[get_session] = get_session_override
+        client = TestClient(app)
+
+        def search(query):
+            return [card["front"] for card in client.get(f"/cards/search?format=json&{query}").json()["items"]]
+
+        #Prefix matches on front and back
+        assert len(search("q=photo")) == 2
+        assert search("q=glu") == ["What does photosynthesis make?"]
+        assert search("q=photo&set_id=2") == ["Photo of the Eiffel Tower is in?"]
+        #Operators and punctuation are just text
+        assert search("q=paris%20AND%20-") == []
+        assert search("q=%22%22") == []
+
+        #The index follows edits and deletes
+        card = session.exec(select(Card).where(Card.back == "Glucose")).one()
+        client.post(f"/cards/{card.id}/edit", data={"front": "Plants make?", "back": "Sugar", "set_id": 1})
+        assert search("q=glucose") == []
+        assert search("q=sugar") == ["Plants make?"]
+        client.post(f"/cards/{card.id}/delete")
+        assert search("q=plants") == []
+
+        response = client.get("/cards/search?q=paris")
+        assert response.status_code == 200
+        assert "Capital of France?" in response.text
+    app.dependency_overrides.clear()
+
+
+def test_query_budgets():
+    from sqlmodel.pool import StaticPool
+    from db.models import Card, Set
+    from db.querycount import query_budget, QueryBudgetExceeded
+    from core.httpcache import page_cache
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        #Lots of sets and cards, so a query per card would blow every budget
+        sets = [Set(name=f"Set {i:02}") for i in range(20)]
+        session.add_all(sets)
+        session.commit()
+        for i in range(1000):
+            session.add(Card(front=f"Question {i:04}", back=f"Answer {i}", set_id=sets[i % 20].id))
+        session.commit()
+        set_id = sets[3].id
+        card_id = session.exec(select(Card.id)).first()
+        session.expunge_all()
+
+        def get_session_override():
+            return session
+        app.dependency_overrides[get_session] = get_session_override
+        client = TestClient(app)
+        page_cache.clear()
+
+        #Cached pages look up their version counters first, which is one more query
+        with query_budget(engine, 0):
+            assert client.get("/").status_code == 200
+        with query_budget(engine, 2):
+            response = client.get("/cards/?limit=200")
+        assert response.status_code == 200
+        assert "Set 19" in response.text
+        session.expunge_all()
+        with query_budget(engine, 3):
+            response = client.get(f"/sets/{set_id}?limit=200")
+        assert response.text.count('class="card"') == 50
+        session.expunge_all()
+        with query_budget(engine, 2):
+            assert "Set 00" in client.get(f"/cards/{card_id}").text
+        session.expunge_all()
+        with query_budget(engine, 1):
+            assert client.get("/cards/search?q=question&limit=100").status_code == 200
+
+        #The hook itself fails loudly
+        session.expunge_all()
+        try:
+            with query_budget(engine, 1):
+                for card in session.exec(select(Card).limit(5)).all():
+                    card.set.name
+        except QueryBudgetExceeded as error:
+            assert "ran 6" in str(error)
+        else:
+            assert False, "budget should have been exceeded"
+    app.dependency_overrides.clear()
+
+
+def test_http_cache():
+    from sqlmodel.pool import StaticPool
+    from db.models import Card, Set
+    from db.querycount import count_queries
+    from core.httpcache import page_cache
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        science = Set(name="Science")
+        history = Set(name="History")
+        session.add_all([science, history])
+        session.commit()
+        session.add(Card(front="What is H2O?", back="Water", set_id=science.id))
+        session.commit()
+        card_id = session.exec(select(Card.id)).one()
+
+        def get_session_override():
+            return session
+        app.dependency_overrides[get_session] = get_session_override
+        client = TestClient(app)
+        page_cache.clear()
+
+        response = client.get(f"/sets/{science.id}")
+        etag = response.headers["etag"]
+        assert "Last-Modified" in response.headers
+        #Same etag again: 304, and only the version counters were read
+        with count_queries(engine) as counter:
+            response = client.get(f"/sets/{science.id}", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert counter.count == 1
+        #A new browser gets the page from the cache instead of rendering it again
+        hits = page_cache.hits
+        with count_queries(engine) as counter:
+            response = client.get(f"/sets/{science.id}")
+        assert response.status_code == 200
+        assert "What is H2O?" in response.text
+        assert counter.count == 1
+        assert page_cache.hits == hits + 1
+
+        #Changes to the set's cards (or a card moving out of it) change the etag
+        client.post(f"/cards/{card_id}/edit", data={"front": "What is ice?", "back": "Water", "set_id": science.id})
+        response = client.get(f"/sets/{science.id}", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert "What is ice?" in response.text
+        etag = response.headers["etag"]
+        history_etag = client.get(f"/sets/{history.id}").headers["etag"]
+        client.post(f"/cards/{card_id}/edit", data={"front": "What is ice?", "back": "Water", "set_id": history.id})
+        assert client.get(f"/sets/{science.id}", headers={"If-None-Match": etag}).status_code == 200
+        assert client.get(f"/sets/{history.id}", headers={"If-None-Match": history_etag}).status_code == 200
+
+        #Renaming a set shows up on the card list, which prints set names
+        etag = client.get("/cards/").headers["etag"]
+        assert client.get("/cards/", headers={"If-None-Match": etag}).status_code == 304
+        client.post(f"/sets/{history.id}/edit", data={"name": "Chemistry"})
+        response = client.get("/cards/", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert "Chemistry" in response.text
+
+        assert client.get("/cards/999").status_code == 404
+    app.dependency_overrides.clear()
+
+
+def test_json_api():
+    import gzip
+    from sqlmodel.pool import StaticPool
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        def get_session_override():
+            return session
+        app.dependency_overrides[get_session] = get_session_override
+        client = TestClient(app)
+
+        response = client.post("/api/v1/sets", json={"name": "Science"})
+        assert response.status_code == 201
+        set_id = response.json()["id"]
+        ids = []
+        for i in range(30):
+            response = client.post("/api/v1/cards", json={"front": f"Question {i:02}", "back": f"Answer {i}", "set_id": set_id})
+            ids.append(response.json()["id"])
+        assert client.post("/api/v1/cards", json={"front": "Q", "back": "A", "set_id": 999}).status_code == 400
+
+        #Pages use the same cursors as the html pages, and only send the fields asked for
+        page = client.get("/api/v1/cards?limit=20&fields=front").json()
+        assert page["items"][0] == {"front": "Question 00"}
+        page = client.get(f"/api/v1/sets/{set_id}/cards?limit=20&fields=id,front&after=" + page["next"]).json()
+        assert [card["front"] for card in page["items"]] == [f"Question {i}" for i in range(20, 30)]
+        assert client.get("/api/v1/cards?fields=front,password").status_code == 400
+
+        response = client.get(f"/api/v1/cards/batch?ids={ids[5]}&ids=12345&ids={ids[2]}&fields=back")
+        assert response.json() == {"items": [{"back": "Answer 5"}, {"back": "Answer 2"}], "missing": [12345]}
+        assert client.get(f"/api/v1/sets/batch?ids={set_id}").json()["items"] == [{"id": set_id, "name": "Science"}]
+
+        response = client.patch(f"/api/v1/cards/{ids[0]}", json={"back": "Changed"})
+        assert response.json() == {"id": ids[0], "front": "Question 00", "back": "Changed", "set_id": set_id}
+        assert client.patch(f"/api/v1/sets/{set_id}", json={"name": "Biology"}).json()["name"] == "Biology"
+        assert client.delete(f"/api/v1/cards/{ids[0]}").status_code == 204
+        assert client.get(f"/api/v1/cards/{ids[0]}").status_code == 404
+
+        #Big enough responses are compressed when the client asks
+        response = client.get("/api/v1/cards", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(response.json()["items"]) == 29
+        response = client.get("/api/v1/cards", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+    app.dependency_overrides.clear()
+
+
+def test_metrics():
+    from sqlmodel.pool import StaticPool
+    from db.models import Card
+    from core.metrics import instrument_engine, http_db_queries, template_latency, ws_connections
+    from core.profiler import SlowRequestProfiler
+    from core.connections import ConnectionManager
+    engine = instrument_engine(create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    ))
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        session.add(Card(front="What is H2O?", back="Water"))
+        session.commit()
+        card_id = session.exec(select(Card.id)).one()
+
+        def get_session_override():
+            return session
+        app.dependency_overrides[get_session] = get_session_override
+        client = TestClient(app)
+
+        renders = template_latency.count(template="/cards/card.html")
+        requests = http_db_queries.count(route="/cards/{id}")
+        #fresh=1 so the page cache can't answer with a page from an earlier test
+        client.get(f"/cards/{card_id}?action=view&fresh=1")
+        client.get("/cards/999")
+        assert http_db_queries.count(route="/cards/{id}") == requests + 2
+        assert template_latency.count(template="/cards/card.html") == renders + 1
+
+        text = client.get("/metrics").text
+        #Labelled by route template, not url
+        assert 'http_requests_total{method="GET",route="/cards/{id}",status="404"}' in text
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/cards/{id}",le="+Inf"}' in text
+        assert "db_query_duration_seconds_count" in text
+        assert 'cache_stats{cache="pages",stat="hit_rate"}' in text
+        assert client.get("/metrics/profiles").status_code == 404
+
+        #Every request over the threshold keeps its samples as folded stacks
+        profiler = SlowRequestProfiler(threshold=0, interval=0.001)
+        profiler.start()
+        try:
+            import time
+            started = time.perf_counter()
+            while time.perf_counter() - started < 0.05:
+                pass
+            profiler.record("GET /busy", started, time.perf_counter())
+        finally:
+            profiler.stop()
+        profile = profiler.profiles[0]
+        assert profile["request"] == "GET /busy"
+        assert profile["samples"] > 0
+        assert "test_main.py:test_metrics" in profile["folded"]
+    app.dependency_overrides.clear()
+
+    #Open websockets are counted as they come and go
+    class FakeWebSocket:
+        async def accept(self):
+            pass
+    import asyncio
+    async def run():
+        manager = ConnectionManager()
+        before = ws_connections.value()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+        assert ws_connections.value() == before + 1
+        manager.disconnect(websocket)
+        manager.disconnect(websocket)
+        assert ws_connections.value() == before
+    asyncio.run(run())
+
+
+def test_proxy_headers():
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse as StarletteJSON
+    from starlette.routing import Route, WebSocketRoute
+    from core.proxy import ProxyHeadersMiddleware, TrustedProxies
+
+    async def echo(request):
+        return StarletteJSON({"url": str(request.url_for("echo")), "client": request.client.host})
+    async def echo_ws(websocket):
+        await websocket.accept()
+        await websocket.send_json({"scheme": websocket.url.scheme, "host": websocket.url.hostname})
+        await websocket.close()
+    inner = Starlette(routes=[Route("/echo", echo, name="echo"), WebSocketRoute("/ws", echo_ws)])
+    headers = {"X-Forwarded-Proto": "https", "X-Forwarded-Host": "cards.example.com", "X-Forwarded-For": "203.0.113.7, 10.0.0.2"}
+
+    client = TestClient(ProxyHeadersMiddleware(inner, trusted="*"))
+    assert client.get("/echo").json() == {"url": "http://testserver/echo", "client": "testclient"}
+    assert client.get("/echo", headers=headers).json()["url"] == "https://cards.example.com/echo"
+    with client.websocket_connect("/ws", headers=headers) as websocket:
+        assert websocket.receive_json() == {"scheme": "wss", "host": "cards.example.com"}
+    #Nonsense isn't passed on
+    response = client.get("/echo", headers={"X-Forwarded-Proto": "javascript", "X-Forwarded-Host": "evil.com/path"})
+    assert response.json()["url"] == "http://testserver/echo"
+
+    #Trusting everyone, the client is whoever the first proxy saw
+    assert client.get("/echo", headers=headers).json()["client"] == "203.0.113.7"
+
+    #Otherwise only listed proxies are believed
+    trusted = TrustedProxies("10.0.0.0/8, 127.0.0.1")
+    assert "10.1.2.3" in trusted and "203.0.113.7" not in trusted and "testclient" not in trusted
+    client = TestClient(ProxyHeadersMiddleware(inner, trusted="10.0.0.0/8"))
+    assert client.get("/echo", headers=headers).json()["url"] == "http://testserver/echo"
+
+
+def test_startup_schema_check(tmp_path):
+    from db.schema import head_revisions, check_schema, SchemaOutOfDate
+    from core.templates import templates, precompile_templates
+    engine = create_engine(f"sqlite:///{tmp_path / 'boot.db'}")
+    SQLModel.metadata.create_all(engine)
+
+    #Exactly one newest migration
+    heads = head_revisions()
+    assert len(heads) == 1
+    try:
+        check_schema(engine)
+    except SchemaOutOfDate as error:
+        assert "alembic upgrade head" in str(error)
+    else:
+        assert False, "an unmigrated database should fail the check"
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)")
+        conn.exec_driver_sql("INSERT INTO alembic_version VALUES (?)", (heads.pop(),))
+    check_schema(engine)
+
+    #Every template is compiled up front, under both names the routes use
+    assert precompile_templates() >= 10
+    cached = [name for _, name in templates.env.cache.keys()]
+    assert "/cards/cards.html" in cached and "cards/cards.html" in cached
+
+
+def test_ws_protocol():
+    import asyncio
+    import msgpack
+    from core import protocol
+    from core.connections import ConnectionManager
+
+    client = TestClient(app)
+    with client.websocket_connect("/ws/proto/alice") as alice:
+        #Who's here, then the room hears that alice joined
+        assert json.loads(alice.receive_text()) == {"v": 1, "m": [{"t": "presence", "players": ["alice"]}]}
+        assert protocol.decode(alice.receive_text()) == [{"t": "presence", "join": ["alice"]}]
+        with client.websocket_connect("/ws/proto/bob?encoding=msgpack") as bob:
+            assert msgpack.unpackb(bob.receive_bytes())["m"] == [{"t": "presence", "players": ["alice", "bob"]}]
+            assert protocol.decode(bob.receive_bytes()) == [{"t": "presence", "join": ["bob"]}]
+            assert protocol.decode(alice.receive_text()) == [{"t": "presence", "join": ["bob"]}]
+            bob.send_json({"type": "chat", "payload": {"message": "hi"}})
+            assert protocol.decode(alice.receive_text()) == [{"t": "chat", "from": "bob", "text": "hi"}]
+        assert protocol.decode(alice.receive_text()) == [{"t": "presence", "leave": ["bob"]}]
+
+    class FakeWebSocket:
+        def __init__(self):
+            self.received = []
+        async def accept(self):
+            pass
+        async def send(self, message):
+            self.received.append(message)
+
+    #Broadcasts close together share a frame, and presence changes that
+    #cancel out inside it are dropped
+    async def run():
+        manager = ConnectionManager()
+        new, old = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(new)
+        await manager.connect(old, "text")
+        await manager.broadcast(protocol.chat("alice", "one"))
+        await manager.broadcast(protocol.presence(join=["carol"]))
+        await manager.broadcast(protocol.presence(leave=["carol"]))
+        await manager.broadcast(protocol.presence(leave=["dave"]))
+        await manager.broadcast(protocol.chat("alice", "two"))
+        await asyncio.sleep(0.05)
+        return new, old
+
+    new, old = asyncio.run(run())
+    assert len(new.received) == 1
+    assert protocol.decode(new.received[0]["text"]) == [
+        {"t": "chat", "from": "alice", "text": "one"},
+        {"t": "presence", "leave": ["dave"]},
+        {"t": "chat", "from": "alice", "text": "two"},
+    ]
+    #The old text protocol still gets one string per frame
+    assert [message["text"] for message in old.received] == ["alice says: one", "Client #dave left the chat", "alice says: two"]